@@ -5,10 +5,13 @@ and configures the Flask application instance.
 """
 
 from flask import Flask
+from pathlib import Path
+import atexit
 import os
+import re
+import threading
 from dotenv import load_dotenv
 from .models import init_db
-from .controllers.qr_controller import qr_bp
 
 # Load environment variables from .env file
 load_dotenv()
@@ -24,21 +27,95 @@ def create_app():
     # Configuration
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key')
     app.config['DATABASE_URL'] = os.getenv('DATABASE_URL', 'sqlite:///qr_codes.db')
-    app.config['SQLALCHEMY_DATABASE_URI'] = app.config['DATABASE_URL']
+    # PostgreSQL URLs use the psycopg 3 driver, including ones that still
+    # name the psycopg2 driver, which is no longer installed
+    app.config['SQLALCHEMY_DATABASE_URI'] = re.sub(
+        r'^postgres(?:ql)?(?:\+psycopg2)?://', 'postgresql+psycopg://', app.config['DATABASE_URL']
+    )
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    if not app.config['DATABASE_URL'].startswith('sqlite'):
+        # Keep a pool of live connections instead of reconnecting per request
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+            'pool_size': 10,
+            'max_overflow': 20,
+            'pool_pre_ping': True,
+            'pool_recycle': 1800,
+            # Reuse the most recently returned connection so idle extras can time out
+            'pool_use_lifo': True
+        }
     app.config['QR_CODE_DIR'] = os.getenv('QR_CODE_DIR', 'qr_codes')
+    # Resolved once so image paths are not rebuilt from the string per request
+    app.config['QR_CODE_PATH'] = Path(app.config['QR_CODE_DIR']).resolve()
+    app.config['QR_IMAGE_MAX_AGE'] = int(os.getenv('QR_IMAGE_MAX_AGE', 3600))
+    app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 3600
     app.config['FLASK_ENV'] = os.getenv('FLASK_ENV', 'development')
+    app.config['ACCESS_COUNT_FLUSH_INTERVAL'] = float(os.getenv('ACCESS_COUNT_FLUSH_INTERVAL', 5))
+    app.config['GROQ_API_KEY'] = os.getenv('GROQ_API_KEY')
+    app.config['GROQ_MODEL'] = os.getenv('GROQ_MODEL', 'mixtral-8x7b-32768')
+    app.config['GROQ_RPM'] = int(os.getenv('GROQ_RPM', 30))
 
     # Initialize database
     init_db(app)
 
-    # Register blueprints
+    # Register blueprints (imported here so `import app` stays lightweight)
+    from .controllers.qr_controller import qr_bp
     app.register_blueprint(qr_bp)
 
+    @app.after_request
+    def strip_html_validators(response):
+        """Drop cache validators from dynamic HTML pages.
+
+        Rendered pages change with every QR code update, so an ETag only adds
+        header bytes. Static assets such as QR images keep their validators.
+        """
+        if response.mimetype == 'text/html':
+            response.headers.pop('ETag', None)
+            response.cache_control.no_cache = True
+        return response
+
+    @atexit.register
+    def flush_access_counts():
+        """Persist access counts still buffered when the worker exits."""
+        from .services.qr_service import QRCodeService
+
+        with app.app_context():
+            try:
+                QRCodeService.flush_access_counts()
+            except Exception as e:
+                app.logger.warning(f'Failed to flush access counts on exit: {e}')
+
     # Verify GROQ configuration
-    if not os.getenv('GROQ_API_KEY'):
+    if not app.config['GROQ_API_KEY']:
         app.logger.warning('GROQ_API_KEY not set. LLM features will be disabled.')
     else:
         app.logger.info('GROQ API configured successfully.')
 
-    return app 
\ No newline at end of file
+    return app 
+
+def start_access_count_flusher(app):
+    """Flush buffered access counts every interval, even without traffic.
+
+    Redirects only flush when they arrive after the interval has elapsed, so
+    without this thread the counts from the last burst of scans stay in
+    memory until the next one.
+
+    Args:
+        app (Flask): The application whose database receives the counts
+
+    Returns:
+        threading.Event: Set it to stop the thread
+    """
+    from .services.qr_service import QRCodeService
+
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(app.config['ACCESS_COUNT_FLUSH_INTERVAL']):
+            with app.app_context():
+                try:
+                    QRCodeService.flush_access_counts()
+                except Exception as e:
+                    app.logger.warning(f'Failed to flush access counts: {e}')
+
+    threading.Thread(target=run, name='access-count-flush', daemon=True).start()
+    return stop
@@ -4,25 +4,61 @@ This module defines the routes and request handling logic for the QR code
 generation and management system.
 """
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash, send_from_directory, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, send_from_directory, jsonify, abort, Response, stream_with_context
+from ..models import db
 from ..models.qr_code import QRCode
 from ..services.qr_service import QRCodeService
-from ..services.llm_service import LLMService
 from flask import current_app
-import os
-import requests
+from sqlalchemy.orm import load_only
+from werkzeug.exceptions import HTTPException
+import json
 
 qr_bp = Blueprint('qr', __name__, url_prefix='')
 
+# Number of QR codes shown per page on the home page
+INDEX_PAGE_SIZE = 50
+
+def _get_llm_service():
+    """Return the process-wide LLM service, creating it on first use.
+
+    The instance is kept in ``app.extensions`` so its pooled HTTP session is
+    reused by every chat request served by this worker.
+
+    Returns:
+        LLMService: The shared LLM service instance
+
+    Raises:
+        ValueError: If the LLM service is not configured
+    """
+    from ..services.llm_service import LLMService
+
+    llm_service = current_app.extensions.get('llm_service')
+    if llm_service is None:
+        llm_service = current_app.extensions['llm_service'] = LLMService(
+            model=current_app.config['GROQ_MODEL']
+        )
+        current_app.logger.info(f"LLM Service initialized with model: {llm_service.model}")
+    return llm_service
+
 @qr_bp.route('/')
 def index():
     """Route handler for the home page.
     
     Returns:
-        str: Rendered HTML template with list of QR codes
+        str: Rendered HTML template with a page of QR codes
     """
-    qr_codes = QRCode.query.order_by(QRCode.created_at.desc()).all()
-    return render_template('index.html', qr_codes=qr_codes)
+    # Only load the columns the listing template renders
+    pagination = QRCode.query.options(
+        load_only(
+            QRCode.id, QRCode.url, QRCode.filename, QRCode.description,
+            QRCode.is_dynamic, QRCode.is_active, QRCode.created_at, QRCode.updated_at
+        )
+    ).order_by(QRCode.created_at.desc(), QRCode.id.desc()).paginate(
+        page=request.args.get('page', 1, type=int),
+        per_page=INDEX_PAGE_SIZE,
+        error_out=False
+    )
+    return render_template('index.html', qr_codes=pagination.items, pagination=pagination)
 
 @qr_bp.route('/generate', methods=['POST'])
 def generate():
@@ -44,7 +80,7 @@ def generate():
         fill_color=request.form.get('fill_color', 'red'),
         back_color=request.form.get('back_color', 'white'),
         description=request.form.get('description', ''),
-        qr_code_dir=current_app.config['QR_CODE_DIR']
+        qr_code_dir=current_app.config['QR_CODE_PATH']
     )
 
     # Generate QR code with dynamic or static URL
@@ -64,14 +100,15 @@ def redirect_qr(short_code):
     Returns:
         Response: Redirect to the target URL
     """
-    qr_code = QRCode.query.filter_by(short_code=short_code, is_active=True).first_or_404()
-    QRCodeService.increment_access_count(qr_code)
-    return redirect(qr_code.url)
+    target = QRCodeService.record_redirect(short_code)
+    if target is None:
+        abort(404)
+    return redirect(target.url)
 
 @qr_bp.route('/qr/<int:qr_id>/edit', methods=['GET', 'POST'])
 def edit_qr(qr_id):
     """Handle QR code editing requests."""
-    qr_code = QRCode.query.get_or_404(qr_id)
+    qr_code = db.get_or_404(QRCode, qr_id)
     
     if request.method == 'POST':
         # Validate filename if provided
@@ -88,7 +125,7 @@ def edit_qr(qr_id):
             description=request.form.get('description', ''),
             filename=new_filename,
             is_active='is_active' in request.form,
-            qr_code_dir=current_app.config['QR_CODE_DIR']
+            qr_code_dir=current_app.config['QR_CODE_PATH']
         )
         
         flash('QR Code updated successfully!', 'success')
@@ -106,8 +143,8 @@ def delete_qr(qr_id):
     Returns:
         Response: Redirect to index page
     """
-    qr_code = QRCode.query.get_or_404(qr_id)
-    QRCodeService.delete_qr_code(qr_code, current_app.config['QR_CODE_DIR'])
+    qr_code = db.get_or_404(QRCode, qr_id)
+    QRCodeService.delete_qr_code(qr_code, current_app.config['QR_CODE_PATH'])
     
     flash('QR Code deleted successfully!', 'success')
     return redirect(url_for('qr.index'))
@@ -120,9 +157,19 @@ def serve_qr_code(filename):
         filename (str): Name of the QR code image file
         
     Returns:
-        Response: The requested image file
+        Response: The requested image file, cacheable and revalidated
+        through its ETag/Last-Modified validators
     """
-    return send_from_directory(current_app.config['QR_CODE_DIR'], filename)
+    # Images are regenerated in place when a QR code is edited, so they are
+    # cached for a bounded time instead of being marked immutable
+    response = send_from_directory(
+        current_app.config['QR_CODE_PATH'],
+        filename,
+        conditional=True,
+        max_age=current_app.config['QR_IMAGE_MAX_AGE']
+    )
+    response.cache_control.public = True
+    return response
 
 @qr_bp.route('/d/<short_code>')
 def dynamic_redirect(short_code):
@@ -134,73 +181,151 @@ def dynamic_redirect(short_code):
     Returns:
         Response: Redirect to the target URL
     """
-    qr_code = QRCode.query.filter_by(short_code=short_code, is_active=True).first_or_404()
-    QRCodeService.increment_access_count(qr_code)
-    return redirect(qr_code.redirect_url or qr_code.url)
+    target = QRCodeService.record_redirect(short_code)
+    if target is None:
+        abort(404)
+    return redirect(target.redirect_url or target.url)
 
 @qr_bp.route('/qr/<int:qr_id>/view')
-def view_qr(qr_id):
-    qr_code = QRCode.query.get_or_404(qr_id)
+def view_qr_details(qr_id):
+    """Show the details page for a QR code.
+
+    The LLM status shown on the page is derived from configuration only; no
+    request is made to the Groq API while rendering.
+    
+    Args:
+        qr_id (int): ID of the QR code to show
+        
+    Returns:
+        str: Rendered HTML template with the QR code details
+    """
+    qr_code = db.get_or_404(QRCode, qr_id)
     
     # Check if GROQ_API_KEY exists and is not empty
-    groq_enabled = bool(os.getenv('GROQ_API_KEY'))
-    current_model = os.getenv('GROQ_MODEL', 'mixtral-8x7b-32768')
+    groq_enabled = bool(current_app.config['GROQ_API_KEY'])
+    current_model = current_app.config['GROQ_MODEL']
     
     return render_template('view.html', 
                          qr_code=qr_code, 
                          groq_enabled=groq_enabled,
                          current_model=current_model)
 
+def _read_chat_message():
+    """Read and check the message of a chat request.
+
+    Returns:
+        tuple: ``(user_input, error)``; ``error`` is the JSON error response
+        to return when the message is missing or the LLM is not configured
+    """
+    payload = request.get_json(silent=True)
+    user_input = payload.get('message') if isinstance(payload, dict) else None
+    current_app.logger.info(f"Received chat message: {user_input}")
+
+    if not user_input:
+        current_app.logger.warning("No message provided")
+        return None, (jsonify({
+            "success": False,
+            "response": "No message provided"
+        }), 400)
+
+    # Check if Groq API is configured
+    if not current_app.config['GROQ_API_KEY']:
+        current_app.logger.error("GROQ_API_KEY not configured")
+        return None, (jsonify({
+            "success": False,
+            "response": "LLM service is not configured. Please set GROQ_API_KEY in environment variables."
+        }), 503)
+
+    return user_input, None
+
 @qr_bp.route('/chat', methods=['POST'])
 def chat():
     """Handle natural language chat requests for QR code operations."""
+    user_input, error = _read_chat_message()
+    if error:
+        return error
+
+    # Imported lazily so workers that never serve chat skip the LLM/HTTP stack
+    import requests
+
     try:
-        user_input = request.json.get('message')
-        current_app.logger.info(f"Received chat message: {user_input}")
-        
-        if not user_input:
-            current_app.logger.warning("No message provided")
-            return jsonify({
-                "success": False,
-                "response": "No message provided"
-            }), 400
-            
-        # Check if Groq API is configured
-        if not os.getenv('GROQ_API_KEY'):
-            current_app.logger.error("GROQ_API_KEY not configured")
-            return jsonify({
-                "success": False,
-                "response": "LLM service is not configured. Please set GROQ_API_KEY in environment variables."
-            }), 503
-            
-        try:
-            llm_service = LLMService()
-            current_app.logger.info("Processing message with LLM service")
-            result = llm_service.process_user_request(user_input)
-            current_app.logger.info(f"LLM response: {result}")
-            return jsonify(result)
-            
-        except ValueError as ve:
-            current_app.logger.error(f"LLM configuration error: {str(ve)}")
-            return jsonify({
-                "success": False,
-                "response": f"LLM service configuration error: {str(ve)}"
-            }), 503
-            
-        except requests.RequestException as re:
-            current_app.logger.error(f"Groq API error: {str(re)}")
-            return jsonify({
-                "success": False,
-                "response": "Unable to connect to LLM service. Please try again later."
-            }), 503
-            
-    except Exception as e:
-        current_app.logger.error(f"Unexpected chat error: {str(e)}")
+        llm_service = _get_llm_service()
+        current_app.logger.info("Processing message with LLM service")
+        result = llm_service.process_user_request(user_input)
+        current_app.logger.info(f"LLM response: {result}")
+        return jsonify(result)
+
+    except ValueError as ve:
+        current_app.logger.error(f"LLM configuration error: {str(ve)}")
+        return jsonify({
+            "success": False,
+            "response": f"LLM service configuration error: {str(ve)}"
+        }), 503
+
+    except requests.RequestException as re:
+        current_app.logger.error(f"Groq API error: {str(re)}")
+        return jsonify({
+            "success": False,
+            "response": "Unable to connect to LLM service. Please try again later."
+        }), 503
+
+@qr_bp.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """Stream the reply to a chat message as server-sent events.
+
+    ``token`` events carry reply text as the model generates it; a final
+    ``result`` event carries the same JSON body that ``/chat`` returns.
+
+    Returns:
+        Response: A ``text/event-stream`` response
+    """
+    user_input, error = _read_chat_message()
+    if error:
+        return error
+
+    try:
+        llm_service = _get_llm_service()
+    except ValueError as ve:
+        current_app.logger.error(f"LLM configuration error: {str(ve)}")
         return jsonify({
             "success": False,
-            "error": str(e),
-            "response": "An unexpected error occurred. Please try again."
-        }), 500
+            "response": f"LLM service configuration error: {str(ve)}"
+        }), 503
+
+    def generate():
+        for event, data in llm_service.stream_user_request(user_input):
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Tell nginx to pass events through instead of buffering the response
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@qr_bp.errorhandler(Exception)
+def handle_unexpected_error(e):
+    """Return a JSON error for unexpected failures in JSON endpoints.
+
+    HTTP errors (404s, redirects) pass through unchanged and non-JSON
+    requests keep Flask's default error handling.
+
+    Args:
+        e (Exception): The unhandled exception
+
+    Returns:
+        Response: JSON error response with status 500
+    """
+    if isinstance(e, HTTPException):
+        return e
+    if not request.is_json:
+        raise e
+
+    current_app.logger.error(f"Unexpected error in {request.path}: {str(e)}")
+    return jsonify({
+        "success": False,
+        "error": str(e),
+        "response": "An unexpected error occurred. Please try again."
+    }), 500
 
 @qr_bp.route('/update_model', methods=['POST'])
 def update_model():
@@ -225,8 +350,13 @@ def update_model():
                 'error': 'Invalid model selection'
             }), 400
             
-        # Update model in environment
-        os.environ['GROQ_MODEL'] = model
+        # Store the selection in app config rather than the process environment
+        current_app.config['GROQ_MODEL'] = model
+
+        # Keep an already-built LLM service in sync with the selection
+        llm_service = current_app.extensions.get('llm_service')
+        if llm_service is not None:
+            llm_service.model = model
         
         return jsonify({
             'success': True,
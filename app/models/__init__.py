@@ -10,10 +10,11 @@ db = SQLAlchemy()
 
 def init_db(app):
     """Initialize the database with the Flask application.
+
+    The schema is managed by Flask-Migrate (``flask db upgrade``) as a
+    separate deploy step, so no DDL is issued when the app is created.
     
     Args:
         app (Flask): The Flask application instance
     """
     db.init_app(app)
-    with app.app_context():
-        db.create_all() 
\ No newline at end of file
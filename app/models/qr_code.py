@@ -4,8 +4,10 @@ This module defines the QRCode model class which represents the database schema
 for storing QR codes and their associated metadata.
 """
 
-from datetime import datetime
 import secrets
+import uuid
+from flask import current_app
+from sqlalchemy import func, text
 from . import db
 
 class QRCode(db.Model):
@@ -24,42 +26,73 @@ class QRCode(db.Model):
         access_count (int): Number of times the QR code has been scanned
         is_dynamic (bool): Whether this is a dynamic QR code
         short_code (str): Unique identifier for dynamic QR codes
+        redirect_url (str): Optional target that overrides url for dynamic redirects
     """
 
     __tablename__ = 'qr_codes'
+    __table_args__ = (
+        # Backs the newest-first ordering (with id as tie-breaker) used by
+        # the paginated QR code listings
+        db.Index('ix_qr_codes_created_at_id', text('created_at DESC'), text('id DESC')),
+        # Backs listings filtered by active status in newest-first order
+        db.Index('ix_qr_codes_active_created_at', 'is_active', text('created_at DESC')),
+        # Covering index for redirect lookups of active short codes
+        db.Index(
+            'ix_qr_codes_short_code_active', 'short_code',
+            postgresql_where=text('is_active'),
+            postgresql_include=['url', 'redirect_url'],
+            sqlite_where=text('is_active')
+        ),
+    )
+    # Fetch server-generated timestamps with RETURNING instead of a later SELECT
+    __mapper_args__ = {'eager_defaults': True}
     
     id = db.Column(db.Integer, primary_key=True)
     url = db.Column(db.String(500), nullable=False)
     filename = db.Column(db.String(255), nullable=False)
     fill_color = db.Column(db.String(50), default='red')
     back_color = db.Column(db.String(50), default='white')
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Timestamps are filled in by the database so every app instance shares one clock
+    created_at = db.Column(db.DateTime(timezone=True), server_default=func.now())
+    updated_at = db.Column(db.DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     is_active = db.Column(db.Boolean, default=True)
     description = db.Column(db.String(500))
-    access_count = db.Column(db.Integer, default=0)
+    # NOT NULL with a server default so "access_count + n" updates never see NULL
+    access_count = db.Column(db.Integer, nullable=False, default=0, server_default=text('0'))
     is_dynamic = db.Column(db.Boolean, default=False)
     short_code = db.Column(db.String(16), unique=True)
+    redirect_url = db.Column(db.String(500))
 
-    def generate_short_code(self):
-        """Generate a unique short code for dynamic QR codes.
+    @staticmethod
+    def generate_short_code():
+        """Generate a random short code for dynamic QR codes.
+
+        Codes carry 96 bits of randomness, so collisions are practically
+        impossible; the unique index on ``short_code`` remains the only
+        enforcement (see ``QRCodeService.save_qr_code``).
         
         Returns:
-            str: A unique 8-character URL-safe token
+            str: A random 16-character URL-safe token
         """
-        while True:
-            code = secrets.token_urlsafe(8)[:8]
-            if not QRCode.query.filter_by(short_code=code).first():
-                return code
+        return secrets.token_urlsafe(12)
 
     def generate_seo_filename(self):
-        """Generate an SEO-friendly filename based on description or URL."""
+        """Generate an SEO-friendly filename based on description or URL.
+
+        The name is assigned before the row is inserted, so a random suffix
+        (rather than the not-yet-known id) keeps it unique.
+        """
         base = self.description or self.url
         # Convert to lowercase and replace spaces/special chars with hyphens
         safe_name = "".join(c if c.isalnum() else "-" for c in base.lower())
         # Remove consecutive hyphens and trim
         safe_name = "-".join(filter(None, safe_name.split("-")))[:50]
-        return f"qr-{safe_name}-{self.id}.png"
+        return f"qr-{safe_name}-{uuid.uuid4().hex}.png"
+
+    @property
+    def full_path(self):
+        """Path: Location of the QR code image under the app's QR code directory."""
+        return current_app.config['QR_CODE_PATH'] / self.filename
 
     def __init__(self, **kwargs):
         super(QRCode, self).__init__(**kwargs)
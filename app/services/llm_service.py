@@ -4,20 +4,142 @@ This module provides integration between Groq's LLM API and the QR code applicat
 enabling natural language interactions with the system's functionality.
 """
 
-import os
+import re
 import json
+import hashlib
+import random
 import requests
-import time
+import threading
+from time import monotonic, sleep
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from flask import current_app, url_for
 from typing import Dict, Any, List, Optional
 from ..models.qr_code import QRCode
 from ..models import db
-from sqlalchemy import desc
+from .qr_service import QRCodeService, TTLCache
+from ..utils.qr_generator import is_valid_hostname
+from sqlalchemy import func, select
 from datetime import datetime
-from pathlib import Path
-from functools import lru_cache
 from urllib.parse import urlparse, urljoin
-import validators
+
+# Retries made for a Groq API call that is rate limited or hits a server error
+GROQ_RETRIES = 3
+
+# Groq responses that are retried after a backoff
+GROQ_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Longest wait (seconds) before a retry; a call asked to wait longer fails fast
+GROQ_MAX_RETRY_WAIT = 10.0
+
+def _create_http_session():
+    """Create the HTTP session used for Groq API calls.
+
+    Returns:
+        requests.Session: Session with a connection pool for the Groq API
+    """
+    # Only connection failures are retried here: the request was never sent,
+    # so retrying the POST is safe. Rate limits and server errors are retried
+    # by LLMService._post_completion, which takes a rate limit token per attempt.
+    retry = Retry(
+        total=2,
+        connect=2,
+        read=0,
+        status=0,
+        other=0,
+        allowed_methods=frozenset({'POST'}),
+        backoff_factor=0.5,
+        raise_on_status=False
+    )
+    session = requests.Session()
+    session.mount('https://', HTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=retry))
+    session.headers.update({
+        "Content-Type": "application/json",
+        "Accept": "application/json",
+        "Connection": "keep-alive"
+    })
+    return session
+
+# (connect, read) timeouts for Groq API calls; a connection that cannot be
+# opened fails fast instead of holding the worker for the full read timeout
+GROQ_TIMEOUT = (5, 30)
+
+# Default and maximum number of QR codes returned by list_qr_codes and search_qr_codes
+LIST_PAGE_SIZE = 50
+LIST_MAX_PAGE_SIZE = 200
+
+def _int_arg(args, name, default):
+    """Read an optional integer argument of a function call.
+
+    Args:
+        args (dict): Arguments sent by the model
+        name (str): Name of the argument
+        default (int): Value used when the argument is missing or null
+
+    Returns:
+        int: The argument's value
+
+    Raises:
+        ValueError: If the argument is not an integer
+    """
+    value = args.get(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be an integer")
+
+# Functions that only read data; completions that call them (or that call no
+# function at all) can be replayed from the cache
+CACHEABLE_FUNCTIONS = frozenset({'list_qr_codes', 'search_qr_codes', 'count_qr_codes'})
+
+# Groq completion messages for recent prompts, keyed by model and prompt
+_completion_cache = TTLCache(maxsize=1000, ttl=3600)
+
+# Common shape of a URL that format_url accepts: an http(s) scheme and an ASCII
+# host name with no port or user info, optionally followed by a path, query or
+# fragment. Anything else goes through the full parse.
+_URL_FAST_RE = re.compile(
+    r'https?://(?=[^/?#]{1,253}(?:[/?#]|\Z))'
+    r'(?:[A-Za-z0-9](?:[A-Za-z0-9-]{0,61}[A-Za-z0-9])?\.)+[A-Za-z]{2,63}(?:[/?#]|\Z)'
+)
+
+# Requests allowed to burst above the steady Groq rate, and the cap on Groq
+# calls in flight at once from this process
+GROQ_BURST = 5
+GROQ_MAX_CONCURRENT = 4
+
+class TokenBucket:
+    """Thread-safe token bucket rate limiter.
+
+    Tokens refill continuously at ``rate`` per second up to ``capacity``, so
+    short bursts go through immediately while the long-run rate is bounded.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take one token, sleeping only as long as needed for one to refill."""
+        while True:
+            with self._lock:
+                now = monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            # Sleep outside the lock so other threads can still refill and check
+            sleep(wait)
+
+# Shared by every LLMService so keep-alive connections to Groq are reused
+_HTTP = _create_http_session()
 
 class LLMService:
     """Service for handling LLM operations using Groq API."""
@@ -54,12 +176,76 @@ class LLMService:
                 "required": ["url"]
             }
         },
+        "bulk_create_qr_codes": {
+            "name": "bulk_create_qr_codes",
+            "description": "Create several QR codes in one operation",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "qr_codes": {
+                        "type": "array",
+                        "description": "The QR codes to create",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "url": {
+                                    "type": "string",
+                                    "description": "The URL to encode in the QR code"
+                                },
+                                "is_dynamic": {
+                                    "type": "boolean",
+                                    "description": "Whether to create a dynamic QR code"
+                                },
+                                "description": {
+                                    "type": "string",
+                                    "description": "Optional description for the QR code"
+                                },
+                                "fill_color": {
+                                    "type": "string",
+                                    "description": "Color for QR code fill (e.g., '#000000')"
+                                },
+                                "back_color": {
+                                    "type": "string",
+                                    "description": "Color for QR code background (e.g., '#FFFFFF')"
+                                }
+                            },
+                            "required": ["url"]
+                        }
+                    }
+                },
+                "required": ["qr_codes"]
+            }
+        },
         "list_qr_codes": {
             "name": "list_qr_codes",
-            "description": "List all QR codes",
+            "description": "List QR codes, newest first, one page at a time",
             "parameters": {
                 "type": "object",
-                "properties": {}
+                "properties": {
+                    "limit": {
+                        "type": "integer",
+                        "description": "Maximum number of QR codes to return",
+                        "default": 50
+                    },
+                    "offset": {
+                        "type": "integer",
+                        "description": "Number of QR codes to skip",
+                        "default": 0
+                    }
+                }
+            }
+        },
+        "count_qr_codes": {
+            "name": "count_qr_codes",
+            "description": "Count QR codes without listing them, e.g. for 'how many QR codes do I have'",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "is_active": {
+                        "type": "boolean",
+                        "description": "Only count QR codes with this active status"
+                    }
+                }
             }
         },
         "delete_qr_code": {
@@ -100,7 +286,8 @@ class LLMService:
                     },
                     "limit": {
                         "type": "integer",
-                        "description": "Maximum number of results to return"
+                        "description": "Maximum number of results to return",
+                        "default": 50
                     }
                 }
             }
@@ -140,47 +327,128 @@ class LLMService:
             }
         }
     }
+
+    # Function schemas sent with every chat completion, built once
+    FUNCTION_SCHEMAS = list(AVAILABLE_FUNCTIONS.values())
+
+    # System message sent with every chat completion, built once
+    SYSTEM_MESSAGE = {
+        "role": "system",
+        "content": """You are a helpful QR code assistant. You can:
+            1. Create new QR codes
+            2. List existing QR codes
+            3. Search for specific QR codes
+            4. Update QR code properties
+            5. Delete QR codes
+
+            Always validate URLs and provide clear, friendly responses.
+            For errors, explain what went wrong and how to fix it."""
+    }
+
+    # The static parts of every request body, JSON-encoded once
+    _FUNCTION_SCHEMAS_JSON = json.dumps(FUNCTION_SCHEMAS)
+    _SYSTEM_MESSAGE_JSON = json.dumps(SYSTEM_MESSAGE)
     
-    def __init__(self):
-        """Initialize the LLM service with API configuration."""
-        self.api_key = os.getenv('GROQ_API_KEY')
+    def __init__(self, model=None):
+        """Initialize the LLM service from the app's Groq configuration.
+
+        Args:
+            model (str, optional): Groq model to use. Defaults to the
+                GROQ_MODEL app config value.
+
+        Raises:
+            ValueError: If GROQ_API_KEY is not set or GROQ_RPM is not positive
+        """
+        config = current_app.config
+        self.api_key = config['GROQ_API_KEY']
         if not self.api_key:
-            raise ValueError("GROQ_API_KEY environment variable not set")
+            raise ValueError("GROQ_API_KEY is not configured")
+
+        self.requests_per_minute = config['GROQ_RPM']
+        if self.requests_per_minute <= 0:
+            raise ValueError("GROQ_RPM must be greater than 0")
             
         self.api_url = "https://api.groq.com/openai/v1/chat/completions"
-        self.model = os.getenv('GROQ_MODEL', 'mixtral-8x7b-32768')
-        self.rate_limit_delay = 1.0  # Seconds between API calls
-        self._last_api_call = 0
-        current_app.logger.info(f"LLM Service initialized with model: {self.model}")
+        self.model = model or config['GROQ_MODEL']
+        self._bucket = TokenBucket(rate=self.requests_per_minute / 60, capacity=GROQ_BURST)
+        self._concurrency = threading.BoundedSemaphore(GROQ_MAX_CONCURRENT)
+
+        self.session = _HTTP
+        self._auth_headers = {"Authorization": f"Bearer {self.api_key}"}
         
     def _rate_limit(self):
-        """Implement rate limiting for API calls."""
-        now = time.time()
-        time_since_last_call = now - self._last_api_call
-        if time_since_last_call < self.rate_limit_delay:
-            time.sleep(self.rate_limit_delay - time_since_last_call)
-        self._last_api_call = time.time()
-
-    @lru_cache(maxsize=100)
+        """Wait until the Groq request budget (GROQ_RPM) allows another call."""
+        self._bucket.acquire()
+
+    def _build_request_body(self, user_input: str, stream: bool = False) -> bytes:
+        """Build the JSON body of a chat completion request.
+
+        Only the model and the user's message are encoded per call; the
+        function schemas and system message are spliced in pre-encoded.
+
+        Args:
+            user_input (str): The user's message
+            stream (bool, optional): Request a streamed reply. Defaults to False
+
+        Returns:
+            bytes: The encoded request body
+        """
+        user_message = json.dumps({"role": "user", "content": user_input})
+        return (
+            f'{{"model": {json.dumps(self.model)}, '
+            f'"messages": [{self._SYSTEM_MESSAGE_JSON}, {user_message}], '
+            f'"functions": {self._FUNCTION_SCHEMAS_JSON}, '
+            f'"function_call": "auto", "temperature": 0.7, '
+            f'"stream": {json.dumps(stream)}}}'
+        ).encode()
+
+    def _cache_key(self, user_input: str) -> str:
+        """Build the completion cache key for a prompt to the current model."""
+        return hashlib.sha256(f"{self.model}|{user_input}".encode()).hexdigest()
+
     def _get_cached_response(self, user_input: str) -> Optional[Dict]:
-        """Get cached response for identical queries."""
-        return None  # Cache implementation
+        """Get the cached completion message for an identical prompt.
+
+        Only the model's reply is cached; any function it calls is executed
+        again so results always reflect the current data.
+
+        Args:
+            user_input (str): The user's message
+
+        Returns:
+            Optional[Dict]: The cached completion message, or None on a miss
+        """
+        return _completion_cache.get(self._cache_key(user_input))
+
+    def _cache_response(self, user_input: str, message: Dict) -> None:
+        """Cache a completion message unless it calls a state-changing function.
+
+        Args:
+            user_input (str): The user's message
+            message (Dict): The completion message returned by Groq
+        """
+        function_call = message.get('function_call')
+        if function_call and function_call['name'] not in CACHEABLE_FUNCTIONS:
+            return
+        _completion_cache.set(self._cache_key(user_input), message)
 
     def format_qr_code_response(self, qr_codes: List[Dict]) -> str:
         """Format QR code list for better readability."""
         if not qr_codes:
             return "No QR codes found."
             
-        response = "Here are the QR codes:\n\n"
+        # Collect the pieces and join once instead of growing one string
+        parts = ["Here are the QR codes:\n\n"]
         for qr in qr_codes:
-            response += f"📱 QR Code #{qr['id']}\n"
-            response += f"🔗 URL: {qr['url']}\n"
+            parts.append(f"📱 QR Code #{qr['id']}\n🔗 URL: {qr['url']}\n")
             if qr.get('description'):
-                response += f"📝 Description: {qr['description']}\n"
-            response += f"📅 Created: {qr['created_at']}\n"
-            response += f"👁️ Views: {qr.get('access_count', 0)}\n"
-            response += "-------------------\n"
-        return response
+                parts.append(f"📝 Description: {qr['description']}\n")
+            parts.append(
+                f"📅 Created: {qr['created_at']}\n"
+                f"👁️ Views: {qr.get('access_count', 0)}\n"
+                "-------------------\n"
+            )
+        return "".join(parts)
 
     def format_url(self, url: str) -> str:
         """Format and validate URL to ensure proper structure."""
@@ -190,6 +458,10 @@ class LLMService:
         # Add scheme if missing
         if not url.startswith(('http://', 'https://')):
             url = f'https://{url}'
+
+        # Most URLs match the precompiled shape and skip parsing entirely
+        if _URL_FAST_RE.match(url):
+            return url
             
         # Validate URL structure
         parsed = urlparse(url)
@@ -197,114 +469,103 @@ class LLMService:
             raise ValueError("Invalid URL format")
             
         # Validate domain
-        if not validators.domain(parsed.netloc):
+        if not is_valid_hostname(parsed.netloc):
             raise ValueError(f"Invalid domain: {parsed.netloc}")
             
         return url
 
-    def process_user_request(self, user_input: str) -> dict:
-        """Process a user request through the LLM with function calling."""
-        try:
-            # Check cache first
-            cached_response = self._get_cached_response(user_input)
-            if cached_response:
-                return cached_response
+    def _post_completion(self, user_input: str, stream: bool = False):
+        """Send a chat completion request for a prompt to Groq.
 
-            # Apply rate limiting
-            self._rate_limit()
+        Args:
+            user_input (str): The user's message
+            stream (bool, optional): Ask Groq to stream the reply as
+                server-sent events. Defaults to False
 
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-            
-            system_prompt = """You are a helpful QR code assistant. You can:
-            1. Create new QR codes
-            2. List existing QR codes
-            3. Search for specific QR codes
-            4. Update QR code properties
-            5. Delete QR codes
+        Returns:
+            tuple: ``(response, error)``; ``error`` is the user-facing result
+            when the request was rate limited or failed, otherwise None
+        """
+        body = self._build_request_body(user_input, stream=stream)
 
-            Always validate URLs and provide clear, friendly responses.
-            For errors, explain what went wrong and how to fix it."""
-
-            payload = {
-                "model": self.model,
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_input}
-                ],
-                "functions": list(self.AVAILABLE_FUNCTIONS.values()),
-                "function_call": "auto",
-                "temperature": 0.7
-            }
+        for attempt in range(GROQ_RETRIES + 1):
+            self._rate_limit()
 
+            response = None
             try:
-                response = requests.post(
-                    self.api_url,
-                    headers=headers,
-                    json=payload,
-                    timeout=30
-                )
-                
+                with self._concurrency:
+                    response = self.session.post(
+                        self.api_url,
+                        headers=self._auth_headers,
+                        data=body,
+                        timeout=GROQ_TIMEOUT,
+                        stream=stream
+                    )
+
+                if response.status_code in GROQ_RETRY_STATUSES and attempt < GROQ_RETRIES:
+                    delay = self._retry_delay(response, attempt)
+                    if delay <= GROQ_MAX_RETRY_WAIT:
+                        # Release the pooled connection of the unread streamed
+                        # body and wait outside the concurrency slot; the next
+                        # attempt takes a new rate limit token
+                        response.close()
+                        sleep(delay)
+                        continue
+
                 if response.status_code == 429:
-                    return {
+                    response.close()
+                    return None, {
                         "success": False,
                         "response": "I'm receiving too many requests right now. Please try again in a few seconds."
                     }
-                
+
                 response.raise_for_status()
-                
+
             except requests.exceptions.RequestException as e:
-                return {
+                if response is not None:
+                    response.close()
+                return None, {
                     "success": False,
                     "response": "I'm having trouble connecting to my language model. Please try again.",
                     "error": str(e)
                 }
 
-            result = response.json()
-            message = result['choices'][0]['message']
-
-            if 'function_call' in message:
-                function_call = message['function_call']
-                function_name = function_call['name']
-                function_args = json.loads(function_call['arguments'])
-
-                try:
-                    result = self._execute_function(function_name, function_args)
-                    
-                    # Enhanced response formatting
-                    if function_name == 'create_qr_code':
-                        response_text = (
-                            f"✅ Created QR code #{result['qr_code_id']}\n"
-                            f"🔗 URL: {result['url']}\n"
-                            f"📁 Filename: {result['filename']}"
-                        )
-                    elif function_name == 'list_qr_codes':
-                        response_text = self.format_qr_code_response(result['qr_codes'])
-                    else:
-                        response_text = f"I've completed the '{function_name.replace('_', ' ')}' operation successfully."
-                    
-                    return {
-                        "success": True,
-                        "response": response_text,
-                        "function_call": {
-                            "name": function_name,
-                            "result": result
-                        }
-                    }
-                    
-                except ValueError as ve:
-                    return {
-                        "success": False,
-                        "response": f"⚠️ Error: {str(ve)}. Please try again with a valid URL.",
-                        "error": str(ve)
-                    }
+            return response, None
 
-            return {
-                "success": True,
-                "response": message['content']
-            }
+    @staticmethod
+    def _retry_delay(response, attempt):
+        """Return the seconds to wait before retrying a rate limited or failed call.
+
+        Groq's ``Retry-After`` header is used when it gives a number of
+        seconds; otherwise the wait is a jittered exponential backoff.
+
+        Args:
+            response (requests.Response): The rate limited or failed response
+            attempt (int): Number of attempts made before this one, from 0
+
+        Returns:
+            float: Seconds to wait
+        """
+        try:
+            return float(response.headers['Retry-After'])
+        except (KeyError, TypeError, ValueError):
+            return min(2 ** attempt + random.uniform(0, 1), GROQ_MAX_RETRY_WAIT)
+
+    def process_user_request(self, user_input: str) -> dict:
+        """Process a user request through the LLM with function calling."""
+        try:
+            # Identical prompts reuse the model's earlier reply
+            message = self._get_cached_response(user_input)
+            if message is None:
+                response, error = self._post_completion(user_input)
+                if error:
+                    return error
+
+                result = response.json()
+                message = result['choices'][0]['message']
+                self._cache_response(user_input, message)
+
+            return self._respond_to_message(message)
 
         except Exception as e:
             current_app.logger.error(f"Error processing request: {str(e)}")
@@ -313,162 +574,334 @@ class LLMService:
                 "response": "I encountered an unexpected error. Please try again.",
                 "error": str(e)
             }
-    
-    def _execute_function(self, function_name: str, args: Dict[str, Any]) -> Dict[str, Any]:
-        """Execute the specified function with given arguments."""
-        from app.services.qr_service import QRCodeService
-        qr_service = QRCodeService()
-        
-        if function_name == "create_qr_code":
+
+    def stream_user_request(self, user_input: str):
+        """Process a user request, yielding the reply while Groq generates it.
+
+        Cached replies are not streamed; they yield only the final result.
+
+        Args:
+            user_input (str): The user's message
+
+        Yields:
+            tuple: ``("token", str)`` for each piece of reply text, then one
+            ``("result", dict)`` holding what :meth:`process_user_request`
+            would have returned
+        """
+        try:
+            message = self._get_cached_response(user_input)
+            if message is None:
+                response, error = self._post_completion(user_input, stream=True)
+                if error:
+                    yield "result", error
+                    return
+
+                content, arguments, function_name = [], [], None
+                with response:
+                    for line in response.iter_lines(decode_unicode=True):
+                        if not line or not line.startswith("data: "):
+                            continue
+                        data = line[len("data: "):]
+                        if data == "[DONE]":
+                            break
+
+                        delta = json.loads(data)['choices'][0].get('delta', {})
+                        if delta.get('content'):
+                            content.append(delta['content'])
+                            yield "token", delta['content']
+                        # Function call name and arguments arrive in fragments
+                        if delta.get('function_call'):
+                            function_name = delta['function_call'].get('name') or function_name
+                            arguments.append(delta['function_call'].get('arguments') or "")
+
+                message = {"role": "assistant", "content": "".join(content)}
+                if function_name:
+                    message['function_call'] = {"name": function_name, "arguments": "".join(arguments)}
+                self._cache_response(user_input, message)
+
+            yield "result", self._respond_to_message(message)
+
+        except Exception as e:
+            current_app.logger.error(f"Error streaming request: {str(e)}")
+            yield "result", {
+                "success": False,
+                "response": "I encountered an unexpected error. Please try again.",
+                "error": str(e)
+            }
+
+    def _respond_to_message(self, message: Dict) -> dict:
+        """Turn a completion message into the result returned to the user.
+
+        Any function the model called is executed and its result formatted.
+
+        Args:
+            message (Dict): The completion message returned by Groq
+
+        Returns:
+            dict: The result with ``success`` and ``response`` keys
+        """
+        if 'function_call' in message:
+            function_call = message['function_call']
+            function_name = function_call['name']
+            function_args = json.loads(function_call['arguments'])
+
             try:
-                # Format and validate URL
-                url = self.format_url(args["url"])
+                result = self._execute_function(function_name, function_args)
                 
-                qr_code = QRCode(
-                    url=url,
-                    is_dynamic=args.get("is_dynamic", False),
-                    description=args.get("description", ""),
-                    fill_color=args.get("fill_color", "#000000"),
-                    back_color=args.get("back_color", "#FFFFFF")
-                )
-                
-                db.session.add(qr_code)
-                db.session.commit()
-                
-                # Generate QR code image
-                path = Path(current_app.config['QR_CODE_DIR']) / qr_code.filename
-                if not QRCodeService.generate_qr_image(
-                    qr_code.url,
-                    path,
-                    qr_code.fill_color,
-                    qr_code.back_color
-                ):
-                    raise ValueError("Failed to generate QR code image")
+                # Enhanced response formatting
+                if function_name == 'create_qr_code':
+                    response_text = (
+                        f"✅ Created QR code #{result['qr_code_id']}\n"
+                        f"🔗 URL: {result['url']}\n"
+                        f"📁 Filename: {result['filename']}"
+                    )
+                elif function_name == 'list_qr_codes':
+                    response_text = self.format_qr_code_response(result['qr_codes'])
+                elif function_name == 'count_qr_codes':
+                    response_text = f"You have {result['count']} QR codes."
+                else:
+                    response_text = f"I've completed the '{function_name.replace('_', ' ')}' operation successfully."
                 
                 return {
-                    "qr_code_id": qr_code.id,
-                    "url": qr_code.url,
-                    "filename": qr_code.filename
+                    "success": True,
+                    "response": response_text,
+                    "function_call": {
+                        "name": function_name,
+                        "result": result
+                    }
                 }
                 
-            except Exception as e:
+            except ValueError as ve:
                 return {
                     "success": False,
-                    "error": str(e)
+                    "response": f"⚠️ Error: {str(ve)}. Please try again with a valid URL.",
+                    "error": str(ve)
                 }
-            
-        elif function_name == "list_qr_codes":
-            qr_codes = QRCode.query.order_by(QRCode.created_at.desc()).all()
-            return {
-                "qr_codes": [
-                    {
-                        "id": qr.id,
-                        "url": qr.url,
-                        "filename": qr.filename,
-                        "created_at": qr.created_at.isoformat(),
-                        "access_count": qr.access_count
-                    } for qr in qr_codes
-                ]
-            }
-            
-        elif function_name == "delete_qr_code":
-            qr_code = QRCode.query.get(args["qr_id"])
-            if qr_code:
-                qr_service.delete_qr_code(qr_code, current_app.config['QR_CODE_DIR'])
-                return {"success": True, "message": f"QR code {args['qr_id']} deleted"}
-            return {"success": False, "message": f"QR code {args['qr_id']} not found"}
-            
-        elif function_name == "search_qr_codes":
-            query = QRCode.query
 
-            if args.get("url"):
-                query = query.filter(QRCode.url.ilike(f"%{args['url']}%"))
+        return {
+            "success": True,
+            "response": message['content']
+        }
+    
+    def _execute_function(self, function_name: str, args: Dict[str, Any]) -> Dict[str, Any]:
+        """Execute the specified function with given arguments."""
+        handler = self.FUNCTION_HANDLERS.get(function_name)
+        if handler is None:
+            raise ValueError(f"Unknown function: {function_name}")
+        return handler(self, args)
+
+    def _create_qr_code(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        """Create a QR code and queue rendering of its image."""
+        try:
+            # Format and validate URL
+            url = self.format_url(args["url"])
             
-            if args.get("description"):
-                query = query.filter(QRCode.description.ilike(f"%{args['description']}%"))
+            qr_code = QRCode(
+                url=url,
+                is_dynamic=args.get("is_dynamic", False),
+                description=args.get("description", ""),
+                fill_color=args.get("fill_color", "#000000"),
+                back_color=args.get("back_color", "#FFFFFF")
+            )
             
-            if "is_active" in args:
-                query = query.filter(QRCode.is_active == args["is_active"])
+            QRCodeService.save_qr_code(qr_code)
             
-            if args.get("created_after"):
-                try:
-                    date = datetime.fromisoformat(args["created_after"])
-                    query = query.filter(QRCode.created_at >= date)
-                except ValueError:
-                    raise ValueError("Invalid date format. Use ISO format (YYYY-MM-DD)")
-
-            query = query.order_by(desc(QRCode.created_at))
+            # Render the image in the background; the record is already saved
+            QRCodeService.generate_qr_image_async(
+                qr_code.url,
+                qr_code.full_path,
+                qr_code.fill_color,
+                qr_code.back_color
+            )
             
-            if args.get("limit"):
-                query = query.limit(args["limit"])
-
-            qr_codes = query.all()
+            return {
+                "qr_code_id": qr_code.id,
+                "url": qr_code.url,
+                "filename": qr_code.filename,
+                "status": "rendering"
+            }
             
+        except Exception as e:
             return {
-                "qr_codes": [
-                    {
-                        "id": qr.id,
-                        "url": qr.url,
-                        "filename": qr.filename,
-                        "description": qr.description,
-                        "is_active": qr.is_active,
-                        "created_at": qr.created_at.isoformat(),
-                        "access_count": qr.access_count
-                    } for qr in qr_codes
-                ],
-                "total_results": len(qr_codes)
+                "success": False,
+                "error": str(e)
             }
 
-        elif function_name == "update_qr_code":
-            qr_code = QRCode.query.get(args["qr_id"])
-            if not qr_code:
-                raise ValueError(f"QR code {args['qr_id']} not found")
+    def _bulk_create_qr_codes(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        """Create several QR codes in one batch."""
+        try:
+            entries = [
+                {
+                    "url": self.format_url(entry["url"]),
+                    "is_dynamic": entry.get("is_dynamic", False),
+                    "description": entry.get("description", ""),
+                    "fill_color": entry.get("fill_color", "#000000"),
+                    "back_color": entry.get("back_color", "#FFFFFF")
+                }
+                for entry in args["qr_codes"]
+            ]
+            created = QRCodeService.bulk_create_qr_codes(
+                entries, current_app.config['QR_CODE_PATH']
+            )
+            return {"qr_codes": created}
 
-            # Update fields if provided
-            if "url" in args:
-                if not QRCodeService.validate_url(args["url"]):
-                    raise ValueError("Invalid URL provided")
-                qr_code.url = args["url"]
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e)
+            }
 
-            if "description" in args:
-                qr_code.description = args["description"]
+    def _list_qr_codes(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        """List one page of QR codes, newest first."""
+        limit = min(max(_int_arg(args, "limit", LIST_PAGE_SIZE), 1), LIST_MAX_PAGE_SIZE)
+        offset = max(_int_arg(args, "offset", 0), 0)
 
-            if "is_active" in args:
-                qr_code.is_active = args["is_active"]
+        # Fetch one page of plain rows with just the listed columns; the rows
+        # are turned into dicts as they are read rather than listed first
+        qr_codes = db.session.execute(
+            select(
+                QRCode.id, QRCode.url, QRCode.filename,
+                QRCode.created_at, QRCode.access_count
+            ).order_by(QRCode.created_at.desc(), QRCode.id.desc())
+            .limit(limit)
+            .offset(offset)
+        )
+        return {
+            "qr_codes": [
+                {
+                    "id": qr.id,
+                    "url": qr.url,
+                    "filename": qr.filename,
+                    "created_at": qr.created_at.isoformat(),
+                    "access_count": qr.access_count
+                } for qr in qr_codes
+            ]
+        }
 
-            if "fill_color" in args:
-                qr_code.fill_color = args["fill_color"]
+    def _count_qr_codes(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        """Count QR codes in the database."""
+        # Count in the database rather than loading rows to len() them
+        stmt = select(func.count()).select_from(QRCode)
+        if "is_active" in args:
+            stmt = stmt.where(QRCode.is_active == args["is_active"])
+        return {"count": db.session.scalar(stmt)}
 
-            if "back_color" in args:
-                qr_code.back_color = args["back_color"]
+    def _delete_qr_code(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        """Delete a QR code by ID."""
+        qr_code = db.session.get(QRCode, args["qr_id"])
+        if qr_code:
+            QRCodeService.delete_qr_code(qr_code, current_app.config['QR_CODE_PATH'])
+            return {"success": True, "message": f"QR code {args['qr_id']} deleted"}
+        return {"success": False, "message": f"QR code {args['qr_id']} not found"}
 
-            qr_code.updated_at = datetime.utcnow()
-            
+    def _search_qr_codes(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        """Search QR codes by URL, description, status and creation date."""
+        filters = []
+
+        if args.get("url"):
+            filters.append(QRCode.url.ilike(f"%{args['url']}%"))
+        
+        if args.get("description"):
+            filters.append(QRCode.description.ilike(f"%{args['description']}%"))
+        
+        if "is_active" in args:
+            filters.append(QRCode.is_active == args["is_active"])
+        
+        if args.get("created_after"):
             try:
-                db.session.commit()
-                
-                # Regenerate QR code image if URL changed
-                if "url" in args:
-                    path = Path(current_app.config['QR_CODE_DIR']) / qr_code.filename
-                    QRCodeService.generate_qr_image(
-                        qr_code.url,
-                        path,
-                        qr_code.fill_color,
-                        qr_code.back_color
-                    )
+                date = datetime.fromisoformat(args["created_after"])
+                filters.append(QRCode.created_at >= date)
+            except ValueError:
+                raise ValueError("Invalid date format. Use ISO format (YYYY-MM-DD)")
 
-                return {
-                    "success": True,
-                    "qr_code": {
-                        "id": qr_code.id,
-                        "url": qr_code.url,
-                        "description": qr_code.description,
-                        "is_active": qr_code.is_active,
-                        "updated_at": qr_code.updated_at.isoformat()
-                    }
-                }
-            except Exception as e:
-                db.session.rollback()
-                raise ValueError(f"Failed to update QR code: {str(e)}")
+        limit = min(max(_int_arg(args, "limit", LIST_PAGE_SIZE), 1), LIST_MAX_PAGE_SIZE)
+
+        # Fetch one page of the returned columns; count matches in the database
+        qr_codes = db.session.execute(
+            select(
+                QRCode.id, QRCode.url, QRCode.filename, QRCode.description,
+                QRCode.is_active, QRCode.created_at, QRCode.access_count
+            ).where(*filters)
+            .order_by(QRCode.created_at.desc(), QRCode.id.desc())
+            .limit(limit)
+        ).all()
+        total_results = db.session.scalar(
+            select(func.count()).select_from(QRCode).where(*filters)
+        )
+        
+        return {
+            "qr_codes": [
+                {
+                    "id": qr.id,
+                    "url": qr.url,
+                    "filename": qr.filename,
+                    "description": qr.description,
+                    "is_active": qr.is_active,
+                    "created_at": qr.created_at.isoformat(),
+                    "access_count": qr.access_count
+                } for qr in qr_codes
+            ],
+            "total_results": total_results
+        }
+
+    def _update_qr_code(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        """Update the given fields of a QR code."""
+        qr_code = db.session.get(QRCode, args["qr_id"])
+        if not qr_code:
+            raise ValueError(f"QR code {args['qr_id']} not found")
+
+        # Update fields if provided
+        if "url" in args:
+            if not QRCodeService.validate_url(args["url"]):
+                raise ValueError("Invalid URL provided")
+            qr_code.url = args["url"]
+
+        if "description" in args:
+            qr_code.description = args["description"]
+
+        if "is_active" in args:
+            qr_code.is_active = args["is_active"]
+
+        if "fill_color" in args:
+            qr_code.fill_color = args["fill_color"]
+
+        if "back_color" in args:
+            qr_code.back_color = args["back_color"]
+
+        try:
+            db.session.commit()
+            QRCodeService.invalidate_redirect(qr_code)
             
-        raise ValueError(f"Unknown function: {function_name}")
\ No newline at end of file
+            # Regenerate QR code image if URL changed
+            if "url" in args:
+                QRCodeService.generate_qr_image_async(
+                    qr_code.url,
+                    qr_code.full_path,
+                    qr_code.fill_color,
+                    qr_code.back_color
+                )
+
+            return {
+                "success": True,
+                "qr_code": {
+                    "id": qr_code.id,
+                    "url": qr_code.url,
+                    "description": qr_code.description,
+                    "is_active": qr_code.is_active,
+                    "updated_at": qr_code.updated_at.isoformat()
+                }
+            }
+        except Exception as e:
+            db.session.rollback()
+            raise ValueError(f"Failed to update QR code: {str(e)}")
+
+    # Handler for each function in AVAILABLE_FUNCTIONS, resolved once per class
+    FUNCTION_HANDLERS = {
+        "create_qr_code": _create_qr_code,
+        "bulk_create_qr_codes": _bulk_create_qr_codes,
+        "list_qr_codes": _list_qr_codes,
+        "count_qr_codes": _count_qr_codes,
+        "delete_qr_code": _delete_qr_code,
+        "search_qr_codes": _search_qr_codes,
+        "update_qr_code": _update_qr_code
+    }
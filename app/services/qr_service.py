@@ -4,28 +4,208 @@ This module provides a service layer that handles the business logic for
 QR code operations including creation, updating, deletion, and validation.
 """
 
+import random
 import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
 from pathlib import Path
 from datetime import datetime
-import validators
-from urllib.parse import urlparse
+from flask import current_app
+from sqlalchemy import case, insert, select, update
+from sqlalchemy.exc import IntegrityError
 from ..models.qr_code import QRCode
 from ..models import db
 from ..utils.qr_generator import generate_qr_code, is_valid_url
 
+# Attempts made to insert a dynamic QR code before giving up on short code collisions
+SHORT_CODE_INSERT_ATTEMPTS = 3
+
+# Rows sent per INSERT statement when creating QR codes in bulk
+BULK_INSERT_CHUNK_SIZE = 1000
+
+# Background threads rendering and deleting QR code image files
+QR_RENDER_WORKERS = 2
+
+# QR codes whose pending access counts are written per UPDATE statement
+ACCESS_COUNT_FLUSH_CHUNK_SIZE = 500
+
+# Allow letters, numbers, hyphens, underscores, and .png extension
+_FILENAME_RE = re.compile(r'^[a-zA-Z0-9_-]+\.png$')
+
+class AccessCountBuffer:
+    """Thread-safe in-process buffer of pending access count increments.
+
+    Redirects only bump an in-memory counter; the accumulated increments are
+    written back in one transaction when :meth:`flush` runs.
+    """
+
+    def __init__(self):
+        self._pending = Counter()
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def add(self, qr_id, count=1):
+        """Record ``count`` additional accesses for a QR code."""
+        with self._lock:
+            self._pending[qr_id] += count
+
+    def clear(self):
+        """Drop all pending increments without writing them."""
+        with self._lock:
+            self._pending.clear()
+
+    def is_due(self, interval):
+        """Return True if at least ``interval`` seconds passed since the last flush."""
+        return time.monotonic() - self._last_flush >= interval
+
+    def flush(self):
+        """Write all pending increments to the database.
+
+        Returns:
+            int: Number of QR codes whose access count was updated
+        """
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            self._last_flush = time.monotonic()
+
+        if not pending:
+            return 0
+
+        try:
+            # One UPDATE per chunk of QR codes, each row getting its own
+            # increment through a CASE on the primary key
+            items = list(pending.items())
+            for start in range(0, len(items), ACCESS_COUNT_FLUSH_CHUNK_SIZE):
+                increments = dict(items[start:start + ACCESS_COUNT_FLUSH_CHUNK_SIZE])
+                db.session.execute(
+                    update(QRCode)
+                    .where(QRCode.id.in_(increments))
+                    .values(access_count=QRCode.access_count + case(increments, value=QRCode.id, else_=0))
+                )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            # Put the increments back so they are retried on the next flush
+            with self._lock:
+                self._pending.update(pending)
+            raise
+        return len(pending)
+
+# Pending access counts for this worker process
+access_counts = AccessCountBuffer()
+
+class TTLCache:
+    """Thread-safe in-process LRU cache whose entries expire after ``ttl`` seconds."""
+
+    def __init__(self, maxsize=10_000, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value for ``key``, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """Cache ``value`` under ``key``, evicting the least recently used entry if full."""
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        """Drop ``key`` from the cache if present."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Drop every cached entry."""
+        with self._lock:
+            self._entries.clear()
+
+# Redirect targets of active QR codes, keyed by short code. Entries are dropped
+# explicitly when a QR code is updated or deleted; the TTL bounds how long
+# other worker processes can serve a stale target.
+redirect_cache = TTLCache(maxsize=10_000, ttl=300)
+
+# Renders and deletes QR code images off the request thread; neither needs an
+# app context, and slow (e.g. network) filesystems no longer stall the worker
+_render_pool = ThreadPoolExecutor(max_workers=QR_RENDER_WORKERS, thread_name_prefix='qr-render')
+
+# Latest queued file operation per image path, guarded by _image_jobs_lock
+_image_jobs = {}
+_image_jobs_lock = threading.Lock()
+
+def _run_after(previous, fn, *args, **kwargs):
+    """Run ``fn`` once the given earlier futures have finished."""
+    wait(previous)
+    return fn(*args, **kwargs)
+
+def _submit_image_job(paths, fn, *args, **kwargs):
+    """Queue a file operation on the render pool, ordered per image path.
+
+    The operation starts only after every operation queued earlier for any of
+    ``paths`` has finished, so a delete or rename never races a render that is
+    still pending for the same file. Earlier jobs were queued first, so they
+    are already running by the time this one waits on them.
+
+    Args:
+        paths (list): Image paths the operation reads or writes
+        fn (callable): The file operation to run
+
+    Returns:
+        Future: Resolves to the result of ``fn``
+    """
+    paths = [Path(path) for path in paths]
+    with _image_jobs_lock:
+        previous = [_image_jobs[path] for path in paths if path in _image_jobs]
+        future = _render_pool.submit(_run_after, previous, fn, *args, **kwargs)
+        for path in paths:
+            _image_jobs[path] = future
+
+    def forget(done):
+        with _image_jobs_lock:
+            for path in paths:
+                if _image_jobs.get(path) is done:
+                    del _image_jobs[path]
+
+    future.add_done_callback(forget)
+    return future
+
+def _rename_image(old_path, new_path):
+    """Rename a QR code image file if it exists."""
+    if old_path.exists():
+        old_path.rename(new_path)
+
 class QRCodeService:
     """Service class for handling QR code operations."""
     
     @staticmethod
-    def create_qr_code(url, is_dynamic, fill_color, back_color, description, qr_code_dir):
-        """Create a new QR code record and generate the QR code image.
+    def create_qr_code(url, is_dynamic, fill_color='red', back_color='white', description='', qr_code_dir='qr_codes'):
+        """Create a new QR code record and work out where its image goes.
+
+        The image itself is rendered by the caller, which knows whether to
+        encode the target URL or the dynamic short link.
         
         Args:
             url (str): The URL to encode in the QR code
             is_dynamic (bool): Whether this is a dynamic QR code
-            fill_color (str): Color for the QR code pattern
-            back_color (str): Background color for the QR code
-            description (str): Optional description of the QR code
+            fill_color (str, optional): Color for the QR code pattern. Defaults to 'red'
+            back_color (str, optional): Background color for the QR code. Defaults to 'white'
+            description (str, optional): Description of the QR code. Defaults to ''
             qr_code_dir (str): Directory to store the QR code image
             
         Returns:
@@ -42,11 +222,102 @@ class QRCodeService:
         # Filename will be auto-generated by the model's __init__
         path = Path(qr_code_dir) / qr_code.filename
         
-        db.session.add(qr_code)
-        db.session.commit()
+        QRCodeService.save_qr_code(qr_code)
 
         return qr_code, path
 
+    @staticmethod
+    def save_qr_code(qr_code):
+        """Insert a new QR code, regenerating its short code on collision.
+
+        The short code is not checked up front; the unique index rejects the
+        rare duplicate and the insert is retried with a fresh code.
+
+        Args:
+            qr_code (QRCode): The new QR code to persist
+
+        Raises:
+            IntegrityError: If the insert still fails after
+                SHORT_CODE_INSERT_ATTEMPTS attempts
+        """
+        for attempt in range(SHORT_CODE_INSERT_ATTEMPTS):
+            db.session.add(qr_code)
+            try:
+                db.session.commit()
+                return
+            except IntegrityError:
+                db.session.rollback()
+                if not qr_code.is_dynamic or attempt == SHORT_CODE_INSERT_ATTEMPTS - 1:
+                    raise
+                # Jittered backoff before retrying with a new code
+                delay = 0.01 * 2 ** attempt
+                time.sleep(random.uniform(delay, delay * 2))
+                qr_code.short_code = QRCode.generate_short_code()
+
+    @staticmethod
+    def bulk_create_qr_codes(entries, qr_code_dir):
+        """Create many QR code records at once and generate their images.
+
+        Rows are written with executemany-style INSERT statements of up to
+        BULK_INSERT_CHUNK_SIZE rows each and committed in a single
+        transaction, instead of one INSERT and commit per QR code. Images are
+        rendered in the background after the commit.
+
+        Args:
+            entries (list): Dicts with ``url`` and optional ``is_dynamic``,
+                ``fill_color``, ``back_color`` and ``description`` keys
+            qr_code_dir (str): Directory to store the QR code images
+
+        Returns:
+            list: Dicts with the ``id``, ``url`` and ``filename`` of each
+            created QR code, in the order of ``entries``
+        """
+        # Build through the model so short codes and filenames are assigned
+        qr_codes = [
+            QRCode(
+                url=entry['url'],
+                is_dynamic=entry.get('is_dynamic', False),
+                fill_color=entry.get('fill_color', 'red'),
+                back_color=entry.get('back_color', 'white'),
+                description=entry.get('description', '')
+            )
+            for entry in entries
+        ]
+        rows = [
+            {
+                'url': qr_code.url,
+                'filename': qr_code.filename,
+                'fill_color': qr_code.fill_color,
+                'back_color': qr_code.back_color,
+                'description': qr_code.description,
+                'is_dynamic': qr_code.is_dynamic,
+                'short_code': qr_code.short_code
+            }
+            for qr_code in qr_codes
+        ]
+
+        insert_stmt = insert(QRCode).returning(QRCode.id, sort_by_parameter_order=True)
+        ids = []
+        try:
+            for start in range(0, len(rows), BULK_INSERT_CHUNK_SIZE):
+                batch = rows[start:start + BULK_INSERT_CHUNK_SIZE]
+                ids.extend(db.session.scalars(insert_stmt, batch))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        qr_code_dir = Path(qr_code_dir)
+        for row in rows:
+            QRCodeService.generate_qr_image_async(
+                row['url'], qr_code_dir / row['filename'], row['fill_color'], row['back_color']
+            )
+
+        return [
+            {'id': qr_id, 'url': row['url'], 'filename': row['filename']}
+            for qr_id, row in zip(ids, rows)
+        ]
+
     @staticmethod
     def update_qr_code(qr_code, url, fill_color, back_color, description, filename, is_active, qr_code_dir):
         """Update an existing QR code record and regenerate the image if needed."""
@@ -57,7 +328,7 @@ class QRCodeService:
         
         old_filename = qr_code.filename
         qr_code_dir = Path(qr_code_dir)  # Convert to Path object
-        
+
         # Update QR code attributes
         qr_code.url = url
         qr_code.fill_color = fill_color
@@ -73,16 +344,19 @@ class QRCodeService:
             # Update filename in database
             qr_code.filename = filename
             
-            # Rename physical file if it exists
-            if old_path.exists():
-                old_path.rename(new_path)
+            # Rename the physical file after any pending job on either path
+            _submit_image_job([old_path, new_path], _rename_image, old_path, new_path)
         
         db.session.commit()
+        # Invalidated only once committed, so a concurrent redirect cannot
+        # re-cache the old target
+        QRCodeService.invalidate_redirect(qr_code)
 
-        # Regenerate QR code image
+        # Regenerate QR code image in the background; the previous image is
+        # served until the new one replaces it
         path = qr_code_dir / qr_code.filename
         if not qr_code.is_dynamic:
-            generate_qr_code(qr_code.url, path, qr_code.fill_color, qr_code.back_color)
+            QRCodeService.generate_qr_image_async(qr_code.url, path, qr_code.fill_color, qr_code.back_color)
 
         return qr_code
 
@@ -96,25 +370,87 @@ class QRCodeService:
         Returns:
             bool: True if filename is valid, False otherwise
         """
-        # Allow letters, numbers, hyphens, underscores, and .png extension
-        pattern = r'^[a-zA-Z0-9_-]+\.png$'
-        return bool(re.match(pattern, filename))
+        return bool(_FILENAME_RE.match(filename))
 
     @staticmethod
     def delete_qr_code(qr_code, qr_code_dir):
-        """Delete a QR code record and its associated image file."""
+        """Delete a QR code record and its associated image file.
+
+        The image is removed in the background once the row is gone.
+        """
         path = Path(qr_code_dir) / qr_code.filename
-        if path.exists():
-            path.unlink()
-            
+
         db.session.delete(qr_code)
         db.session.commit()
+        QRCodeService.invalidate_redirect(qr_code)
+
+        QRCodeService.remove_qr_image_async(path)
 
     @staticmethod
     def increment_access_count(qr_code):
-        """Increment the access count for a QR code."""
-        qr_code.access_count += 1
-        db.session.commit()
+        """Increment the access count for a QR code.
+
+        The increment is buffered and written back once the configured
+        ``ACCESS_COUNT_FLUSH_INTERVAL`` has elapsed.
+        """
+        access_counts.add(qr_code.id)
+        QRCodeService.flush_access_counts(force=False)
+
+    @staticmethod
+    def flush_access_counts(force=True):
+        """Write buffered access counts to the database.
+
+        Args:
+            force (bool): Flush even if the flush interval has not elapsed
+
+        Returns:
+            int: Number of QR codes whose access count was updated
+        """
+        if not force and not access_counts.is_due(current_app.config['ACCESS_COUNT_FLUSH_INTERVAL']):
+            return 0
+        return access_counts.flush()
+
+    @staticmethod
+    def record_redirect(short_code):
+        """Count a scan of an active QR code and return its redirect targets.
+
+        The access count increment is buffered (see
+        :meth:`increment_access_count`) and the targets of hot short codes are
+        served from an in-process cache, so a cached redirect does no database
+        work at all.
+
+        Args:
+            short_code (str): Short code of the scanned QR code
+
+        Returns:
+            Row: ``(id, url, redirect_url)`` of the QR code, or None if no
+            active QR code uses the short code
+        """
+        row = redirect_cache.get(short_code)
+        if row is None:
+            row = db.session.execute(
+                select(QRCode.id, QRCode.url, QRCode.redirect_url)
+                .where(QRCode.short_code == short_code, QRCode.is_active == True)
+            ).first()
+            if row is None:
+                return None
+            redirect_cache.set(short_code, row)
+
+        QRCodeService.increment_access_count(row)
+        return row
+
+    @staticmethod
+    def invalidate_redirect(qr_code):
+        """Drop a QR code's cached redirect target after it changes.
+
+        Call this after the change is committed; invalidating earlier lets a
+        concurrent redirect cache the old row again.
+
+        Args:
+            qr_code (QRCode): QR code that is being updated or deleted
+        """
+        if qr_code.short_code:
+            redirect_cache.pop(qr_code.short_code)
 
     @staticmethod
     def validate_url(url):
@@ -129,19 +465,32 @@ class QRCodeService:
         if not url:
             return False
         
-        try:
-            # Parse URL to check protocol
-            parsed = urlparse(url)
-            if parsed.scheme not in ('http', 'https'):
-                return False
-                
-            # Validate URL format
-            return bool(validators.url(url))
-            
-        except Exception:
-            return False
+        return is_valid_url(url)
 
     @staticmethod
     def generate_qr_image(url, path, fill_color, back_color):
         """Generate a QR code image file."""
-        return generate_qr_code(url, path, fill_color, back_color) 
\ No newline at end of file
+        return generate_qr_code(url, path, fill_color, back_color)
+
+    @staticmethod
+    def generate_qr_image_async(url, path, fill_color, back_color):
+        """Queue generation of a QR code image on the background render pool.
+
+        Jobs for the same path run in the order they were queued.
+
+        Returns:
+            Future: Resolves to the result of :meth:`generate_qr_image`
+        """
+        return _submit_image_job([path], generate_qr_code, url, path, fill_color, back_color)
+
+    @staticmethod
+    def remove_qr_image_async(path):
+        """Queue removal of a QR code image file on the background render pool.
+
+        A file that is already gone is ignored. The file is removed only
+        after any render still queued for it, so no orphaned image is left.
+
+        Returns:
+            Future: Resolves once the file has been removed
+        """
+        return _submit_image_job([path], Path(path).unlink, missing_ok=True)
@@ -4,10 +4,20 @@ This module provides functions for generating QR code images and validating URLs
 It also includes logging setup functionality.
 """
 
+import ipaddress
+import re
 import qrcode
 import logging
+from PIL import Image, ImageColor
 import validators
+from functools import lru_cache
 from pathlib import Path
+from urllib.parse import urlsplit
+
+# Public host names: dot-separated labels ending in an alphabetic TLD
+_HOSTNAME_RE = re.compile(
+    r'^(?=.{1,253}$)(?:[A-Za-z0-9](?:[A-Za-z0-9-]{0,61}[A-Za-z0-9])?\.)+[A-Za-z]{2,63}$'
+)
 
 def setup_logging():
     """Configure the logging system for the application."""
@@ -34,20 +44,118 @@ def create_directory(path: Path):
         logging.error(f"Failed to create directory {path}: {e}")
         raise
 
-def is_valid_url(url):
+def is_valid_hostname(host):
+    """Check that a string is a public, fully qualified host name.
+
+    Args:
+        host (str): Host name to check
+
+    Returns:
+        bool: True if the host name is well formed, False otherwise
+    """
+    if not host:
+        return False
+    try:
+        # Internationalised names are checked in their ASCII (punycode) form
+        host = host.encode('idna').decode('ascii')
+    except UnicodeError:
+        return False
+    return _HOSTNAME_RE.match(host) is not None
+
+def _is_valid_host(host):
+    """Check that a URL host is a fully qualified host name or an IP address."""
+    try:
+        # Any IP literal is accepted, so intranet and LAN targets still work
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        return is_valid_hostname(host)
+
+@lru_cache(maxsize=1024)
+def _check_url(url, strict):
+    """Run the checks behind ``is_valid_url``, caching the result per URL."""
+    try:
+        parts = urlsplit(url)
+        valid = (
+            parts.scheme in ('http', 'https')
+            and _is_valid_host(parts.hostname)
+            and not any(c.isspace() for c in url)
+        )
+        # Accessing the port raises ValueError if it is malformed or out of range
+        parts.port
+    except (TypeError, ValueError):
+        valid = False
+
+    if valid and strict:
+        valid = bool(validators.url(url))
+    return valid
+
+def is_valid_url(url, strict=False):
     """Validate if a given string is a valid URL.
+
+    By default this is a cheap structural check: an http(s) scheme, a fully qualified
+    host name or IP address, a valid port and no whitespace. ``strict`` additionally runs
+    the full ``validators.url`` pattern. Results are cached, since the same
+    URLs are validated again when a QR code is created and its image rendered.
     
     Args:
         url (str): URL string to validate
+        strict (bool, optional): Also apply ``validators.url``. Defaults to False
         
     Returns:
         bool: True if URL is valid, False otherwise
     """
-    if validators.url(url):
-        return True
-    else:
+    try:
+        valid = _check_url(url, strict)
+    except TypeError:
+        # Unhashable input cannot be a URL string
+        valid = False
+
+    if not valid:
         logging.error(f"Invalid URL provided: {url}")
-        return False
+    return valid
+
+@lru_cache(maxsize=1024)
+def encode_qr(data):
+    """Encode data into a QR code module matrix, caching the result.
+
+    Encoding (Reed-Solomon error correction and mask selection) depends only
+    on the data, so re-rendering the same data with new colors reuses it.
+
+    Args:
+        data (str): The data to encode in the QR code
+
+    Returns:
+        qrcode.QRCode: The encoded QR code; treat it as read-only
+    """
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr
+
+def render_qr_image(qr, fill_color, back_color):
+    """Render an encoded QR code as a two-color palette image.
+
+    The module matrix (quiet zone included) becomes a one-pixel-per-module
+    image that PIL scales up with nearest-neighbour resampling, instead of
+    drawing every module as a separate rectangle.
+
+    Args:
+        qr (qrcode.QRCode): The encoded QR code
+        fill_color (str): Color of the QR code pattern
+        back_color (str): Background color
+
+    Returns:
+        PIL.Image.Image: The rendered image
+
+    Raises:
+        ValueError: If PIL does not recognise one of the colors
+    """
+    matrix = qr.get_matrix()
+    size = len(matrix)
+    img = Image.frombytes('P', (size, size), bytes(cell for row in matrix for cell in row))
+    img.putpalette(ImageColor.getrgb(back_color)[:3] + ImageColor.getrgb(fill_color)[:3])
+    return img.resize((size * qr.box_size, size * qr.box_size), Image.NEAREST)
 
 def generate_qr_code(data, path, fill_color='red', back_color='white'):
     """Generate a QR code image and save it to the specified path.
@@ -65,13 +173,17 @@ def generate_qr_code(data, path, fill_color='red', back_color='white'):
         return False
 
     try:
-        qr = qrcode.QRCode(version=1, box_size=10, border=5)
-        qr.add_data(data)
-        qr.make(fit=True)
-        img = qr.make_image(fill_color=fill_color, back_color=back_color)
+        qr = encode_qr(data)
+        try:
+            img = render_qr_image(qr, fill_color, back_color)
+        except ValueError:
+            # Colors PIL cannot parse directly (e.g. "transparent") go through qrcode
+            img = qr.make_image(fill_color=fill_color, back_color=back_color)
 
+        # Two-color palette images are written as 1-bit PNGs; light zlib
+        # compression is enough for such small, highly regular data
         with path.open('wb') as qr_file:
-            img.save(qr_file)
+            img.save(qr_file, format='PNG', compress_level=1)
         logging.info(f"QR code successfully saved to {path}")
         return True
 
@@ -10,29 +10,20 @@ until pg_isready -h db -p 5432; do
 done
 echo "PostgreSQL is ready!"
 
-# Ensure migrations directory and subdirectories exist with correct permissions
-echo "Setting up migrations directory..."
-mkdir -p /app/migrations/versions
-chmod -R 777 /app/migrations
-
-# Initialize migrations directory if env.py doesn't exist
-if [ ! -f "/app/migrations/env.py" ]; then
-    echo "Initializing migrations directory..."
-    # Remove existing directory contents if any
-    rm -rf /app/migrations/*
-    
-    export FLASK_APP=manage.py
-    flask db init
-    
-    # Create initial migration
-    echo "Creating initial migration..."
-    flask db migrate -m "Initial migration"
+# Databases created before the migrations were versioned carry a locally
+# generated revision that the committed history does not know; adopt them at
+# the baseline revision, whose schema they already have
+if ! flask db current > /dev/null 2>&1; then
+    echo "Adopting existing database at the baseline migration..."
+    psql "$DATABASE_URL" -c "DELETE FROM alembic_version"
+    flask db stamp 3f1c2a9d8b01
 fi
 
 # Run database migrations
 echo "Running database migrations..."
 flask db upgrade
 
-# Start the Flask application
+# Start the Flask application; exec makes it PID 1 so it receives SIGTERM
+# from docker stop and can flush buffered access counts before exiting
 echo "Starting Flask application..."
-python run.py
\ No newline at end of file
+exec python run.py
\ No newline at end of file
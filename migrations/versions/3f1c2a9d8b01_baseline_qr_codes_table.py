@@ -0,0 +1,46 @@
+"""Baseline qr_codes table
+
+The schema the app created with ``db.create_all()`` before migrations were
+versioned. Databases from that time already have the table; it is only
+created when missing.
+
+Revision ID: 3f1c2a9d8b01
+Revises:
+Create Date: 2024-11-04 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d8b01'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if sa.inspect(op.get_bind()).has_table('qr_codes'):
+        return
+
+    op.create_table('qr_codes',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('url', sa.String(length=500), nullable=False),
+    sa.Column('filename', sa.String(length=255), nullable=False),
+    sa.Column('fill_color', sa.String(length=50), nullable=True),
+    sa.Column('back_color', sa.String(length=50), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('description', sa.String(length=500), nullable=True),
+    sa.Column('access_count', sa.Integer(), nullable=True),
+    sa.Column('is_dynamic', sa.Boolean(), nullable=True),
+    sa.Column('short_code', sa.String(length=16), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('short_code')
+    )
+
+
+def downgrade():
+    op.drop_table('qr_codes')
@@ -0,0 +1,26 @@
+"""Add qr_codes.redirect_url
+
+Revision ID: 7a4e0c5b2d13
+Revises: 3f1c2a9d8b01
+Create Date: 2024-11-04 12:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a4e0c5b2d13'
+down_revision = '3f1c2a9d8b01'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('qr_codes', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('redirect_url', sa.String(length=500), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('qr_codes', schema=None) as batch_op:
+        batch_op.drop_column('redirect_url')
@@ -0,0 +1,73 @@
+"""Server-side timestamps, NOT NULL access_count and listing indexes
+
+Revision ID: c92d6f1e4a57
+Revises: 7a4e0c5b2d13
+Create Date: 2024-11-04 12:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c92d6f1e4a57'
+down_revision = '7a4e0c5b2d13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('UPDATE qr_codes SET access_count = 0 WHERE access_count IS NULL')
+
+    with op.batch_alter_table('qr_codes', schema=None) as batch_op:
+        # Existing timestamps were written with datetime.utcnow()
+        batch_op.alter_column('created_at',
+               existing_type=sa.DateTime(),
+               type_=sa.DateTime(timezone=True),
+               server_default=sa.func.now(),
+               existing_nullable=True,
+               postgresql_using="created_at AT TIME ZONE 'UTC'")
+        batch_op.alter_column('updated_at',
+               existing_type=sa.DateTime(),
+               type_=sa.DateTime(timezone=True),
+               server_default=sa.func.now(),
+               existing_nullable=True,
+               postgresql_using="updated_at AT TIME ZONE 'UTC'")
+        batch_op.alter_column('access_count',
+               existing_type=sa.Integer(),
+               nullable=False,
+               server_default=sa.text('0'))
+
+    # Created after the batch above, which rebuilds the table on SQLite
+    op.create_index('ix_qr_codes_created_at_id', 'qr_codes',
+               [sa.text('created_at DESC'), sa.text('id DESC')])
+    op.create_index('ix_qr_codes_active_created_at', 'qr_codes',
+               ['is_active', sa.text('created_at DESC')])
+    op.create_index('ix_qr_codes_short_code_active', 'qr_codes', ['short_code'],
+               postgresql_where=sa.text('is_active'),
+               postgresql_include=['url', 'redirect_url'],
+               sqlite_where=sa.text('is_active'))
+
+
+def downgrade():
+    op.drop_index('ix_qr_codes_short_code_active', table_name='qr_codes')
+    op.drop_index('ix_qr_codes_active_created_at', table_name='qr_codes')
+    op.drop_index('ix_qr_codes_created_at_id', table_name='qr_codes')
+
+    with op.batch_alter_table('qr_codes', schema=None) as batch_op:
+        batch_op.alter_column('access_count',
+               existing_type=sa.Integer(),
+               nullable=True,
+               server_default=None)
+        batch_op.alter_column('updated_at',
+               existing_type=sa.DateTime(timezone=True),
+               type_=sa.DateTime(),
+               server_default=None,
+               existing_nullable=True,
+               postgresql_using="updated_at AT TIME ZONE 'UTC'")
+        batch_op.alter_column('created_at',
+               existing_type=sa.DateTime(timezone=True),
+               type_=sa.DateTime(),
+               server_default=None,
+               existing_nullable=True,
+               postgresql_using="created_at AT TIME ZONE 'UTC'")
@@ -4,9 +4,11 @@ This module serves as the entry point for running the Flask application.
 It configures logging and starts the development server.
 """
 
+import signal
+import sys
 from flask import Flask
 from flask_migrate import Migrate
-from app import create_app
+from app import create_app, start_access_count_flusher
 from app.models import db
 from app.utils.qr_generator import setup_logging
 
@@ -20,4 +22,8 @@ app = create_migration_app()
 
 if __name__ == '__main__':
     setup_logging()
+    # Exit normally on SIGTERM (docker stop) so the atexit handler flushes
+    # the buffered access counts
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    start_access_count_flusher(app)
     app.run(host='0.0.0.0', port=5000, debug=True) 
\ No newline at end of file
@@ -7,6 +7,9 @@ import os
 import sys
 import pytest
 from pathlib import Path
+from flask import get_flashed_messages
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
 
 # Add the project root directory to Python path
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -14,19 +17,41 @@ sys.path.insert(0, project_root)
 
 from app import create_app
 from app.models import db as _db
+from app.models.qr_code import QRCode
+from app.services.qr_service import QRCodeService, access_counts, redirect_cache
 
-@pytest.fixture(scope='session')
-def app():
-    """Create application for the tests."""
-    # Create a temporary directory for QR codes during testing
-    test_qr_dir = Path('test_qr_codes')
-    test_qr_dir.mkdir(exist_ok=True)
-    
-    # Set environment variables for testing
+def _enable_sqlite_savepoints(engine):
+    """Let SQLAlchemy, not pysqlite, issue BEGIN so SAVEPOINTs work.
+
+    See "Serializable isolation / Savepoints / Transactional DDL" in the
+    SQLAlchemy SQLite dialect documentation.
+    """
+    @event.listens_for(engine, 'connect')
+    def do_connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, 'begin')
+    def do_begin(conn):
+        conn.exec_driver_sql('BEGIN')
+
+class _ConnectionSession(Session):
+    """Session that always runs on the connection it was created with."""
+
+    def get_bind(self, *args, **kwargs):
+        return self.bind
+
+def pytest_configure(config):
+    """Set the test environment once, before any test module builds an app."""
     os.environ['FLASK_ENV'] = 'testing'
     os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
     os.environ['GROQ_API_KEY'] = 'test_key'
     os.environ['GROQ_MODEL'] = 'mixtral-8x7b-32768'
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    """Create application for the tests."""
+    # QR code images go to a temporary directory that pytest cleans up
+    test_qr_dir = tmp_path_factory.mktemp('qr_codes')
     
     # Create the app
     app = create_app()
@@ -37,44 +62,122 @@ def app():
         'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
         'SQLALCHEMY_TRACK_MODIFICATIONS': False,
         'QR_CODE_DIR': str(test_qr_dir),
+        'QR_CODE_PATH': test_qr_dir,
         'SECRET_KEY': 'test_key',
         'WTF_CSRF_ENABLED': False
     })
     
     # Initialize the database
     with app.app_context():
+        _enable_sqlite_savepoints(_db.engine)
         _db.create_all()
     
     yield app
     
     # Clean up
     with app.app_context():
+        QRCodeService.flush_access_counts()
         _db.session.remove()
         _db.drop_all()
-    
-    # Remove test QR code directory
-    if test_qr_dir.exists():
-        import shutil
-        shutil.rmtree(test_qr_dir)
 
-@pytest.fixture(scope='function')
+@pytest.fixture(scope='session', autouse=True)
+def app_context(app):
+    """Keep one application context pushed for the whole test run."""
+    with app.app_context():
+        yield
+
+@pytest.fixture(scope='session')
+def qr_dir(app):
+    """Directory the test app writes QR code images to."""
+    return app.config['QR_CODE_PATH']
+
+@pytest.fixture(scope='session')
 def client(app):
-    """Test client for the application."""
+    """Test client for the application, shared by all tests."""
     return app.test_client()
 
 @pytest.fixture(scope='function')
 def db(app):
-    """Database fixture for tests."""
+    """Database fixture for tests; the schema is created once per run."""
     with app.app_context():
-        _db.create_all()
         yield _db
-        _db.session.remove()
-        _db.drop_all()
 
 @pytest.fixture(scope='function')
 def session(app):
-    """Creates a new database session for each test."""
+    """Run each test inside a transaction that is rolled back afterwards.
+
+    The session is joined to an outer transaction on one connection, so
+    commits made by the code under test only release a SAVEPOINT and nothing
+    a test writes is seen by the next one.
+    """
+    # End any transaction the shared context's session left open; the
+    # in-memory database has a single connection
+    _db.session.remove()
+
     with app.app_context():
-        _db.session.begin_nested()
+        connection = _db.engine.connect()
+        transaction = connection.begin()
+        app_session = _db.session
+        _db.session = _db._make_scoped_session(
+            {
+                'class_': _ConnectionSession,
+                'bind': connection,
+                'join_transaction_mode': 'create_savepoint'
+            }
+        )
+
         yield _db.session
-        _db.session.rollback()
\ No newline at end of file
+
+        _db.session.remove()
+        _db.session = app_session
+        transaction.rollback()
+        connection.close()
+
+        # Rolled-back ids are reused by the next test, so forget anything
+        # cached or buffered for them
+        access_counts.clear()
+        redirect_cache.clear()
+
+@pytest.fixture(scope='function')
+def make_qr_code(session):
+    """Factory that inserts a QR code in the test's transaction and returns it.
+
+    Keyword arguments override the default ``url`` and ``filename``.
+    """
+    def make(**kwargs):
+        qr_code = QRCode(**{'url': 'https://example.com', 'filename': 'test.png', **kwargs})
+        session.add(qr_code)
+        session.flush()
+        return qr_code
+    return make
+
+@pytest.fixture(autouse=True)
+def fast_qr_images(request, monkeypatch):
+    """Write a placeholder instead of rendering QR images in service code.
+
+    Tests marked ``real_qr`` render real images; the generator's own tests
+    call it directly and are not affected.
+    """
+    if 'real_qr' in request.keywords:
+        return
+
+    def write_placeholder(data, path, fill_color='red', back_color='white'):
+        Path(path).write_bytes(b'\x89PNG\r\n\x1a\n')
+        return True
+
+    monkeypatch.setattr('app.services.qr_service.generate_qr_code', write_placeholder)
+
+@pytest.fixture(autouse=True)
+def fast_templates(request, monkeypatch):
+    """Answer controller pages with their flashed messages instead of HTML.
+
+    Tests marked ``real_template`` render the Jinja templates. The stub still
+    consumes the flashed messages, as the templates do.
+    """
+    if 'real_template' in request.keywords:
+        return
+
+    def render_flashes(template_name, **context):
+        return '|'.join(get_flashed_messages())
+
+    monkeypatch.setattr('app.controllers.qr_controller.render_template', render_flashes)
@@ -1,194 +1,406 @@
 import pytest
 from unittest.mock import patch, MagicMock
-from app.services.llm_service import LLMService
+from app.services.llm_service import LLMService, TokenBucket, _completion_cache
 from app.models.qr_code import QRCode
-import os
-from datetime import datetime, timezone
+import json
+from datetime import datetime, timedelta, timezone
 import requests
 
-@pytest.fixture
-def mock_env():
-    """Setup environment variables for testing."""
-    with patch.dict(os.environ, {
+pytestmark = pytest.mark.usefixtures('groq_config')
+
+@pytest.fixture(scope='module')
+def groq_config(app):
+    """Set the Groq configuration once for the whole module."""
+    with patch.dict(app.config, {
         'GROQ_API_KEY': 'test_key',
-        'GROQ_MODEL': 'mixtral-8x7b-32768'
+        'GROQ_MODEL': 'mixtral-8x7b-32768',
+        'GROQ_RPM': 30
     }):
         yield
 
+@pytest.fixture(scope='module')
+def llm_service(groq_config):
+    """LLM service shared by the tests of this module.
+
+    Its token bucket is sized so the module's requests are never throttled;
+    tests that exercise rate limiting build their own service.
+    """
+    service = LLMService()
+    service._bucket = TokenBucket(rate=1000.0, capacity=1000)
+    return service
+
+@pytest.fixture(autouse=True)
+def clear_completion_cache():
+    """Start every test with an empty completion cache."""
+    _completion_cache.clear()
+    yield
+    _completion_cache.clear()
+
+# Completion returned by the mocked Groq API unless a test sets its own
+_DEFAULT_LLM_RESPONSE = {
+    'choices': [{
+        'message': {
+            'content': 'Test response',
+            'function_call': {
+                'name': 'list_qr_codes',
+                'arguments': '{}'
+            }
+        }
+    }]
+}
+
+@pytest.fixture(scope='session')
+def _default_mock_response():
+    """Successful Groq API response shared by the mocked requests."""
+    return MagicMock(status_code=200)
+
 @pytest.fixture
-def mock_requests():
+def mock_requests(_default_mock_response):
     """Mock requests for LLM API calls."""
-    with patch('requests.post') as mock_post:
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_response.json.return_value = {
-            'choices': [{
-                'message': {
-                    'content': 'Test response',
-                    'function_call': {
-                        'name': 'list_qr_codes',
-                        'arguments': '{}'
-                    }
+    # Undo any payload a previous test set on the shared response
+    _default_mock_response.json.return_value = _DEFAULT_LLM_RESPONSE
+    with patch('requests.Session.post', return_value=_default_mock_response) as mock_post:
+        yield mock_post
+    _default_mock_response.reset_mock()
+
+def test_initialization(llm_service):
+    """Test LLM service initialization."""
+    assert llm_service.api_key == 'test_key'
+    assert llm_service.model == 'mixtral-8x7b-32768'
+    assert llm_service.requests_per_minute == 30
+
+def test_initialization_no_api_key(app, monkeypatch):
+    """Test initialization without API key."""
+    monkeypatch.setitem(app.config, 'GROQ_API_KEY', '')
+    with pytest.raises(ValueError, match="GROQ_API_KEY is not configured"):
+        LLMService()
+
+def test_initialization_invalid_rpm(app, monkeypatch):
+    """Test a non-positive request budget is rejected instead of dividing by zero."""
+    monkeypatch.setitem(app.config, 'GROQ_RPM', 0)
+    with pytest.raises(ValueError, match="GROQ_RPM must be greater than 0"):
+        LLMService()
+
+def test_rate_limit(monkeypatch):
+    """Test rate limiting."""
+    service = LLMService()
+    # Fake clock that advances only when the limiter sleeps
+    clock = [1000.0]
+    sleeps = []
+    def fake_sleep(seconds):
+        sleeps.append(seconds)
+        clock[0] += seconds
+    monkeypatch.setattr('app.services.llm_service.sleep', fake_sleep)
+    monkeypatch.setattr('app.services.llm_service.monotonic', lambda: clock[0])
+
+    service._bucket = TokenBucket(rate=1.0, capacity=2)
+    # The burst is served without waiting
+    service._rate_limit()
+    service._rate_limit()
+    assert sleeps == []
+
+    # Once empty, the bucket waits for a token to refill
+    service._rate_limit()
+    assert sleeps == [1.0]
+
+def test_build_request_body(llm_service):
+    """Test the pre-encoded request body decodes to the full payload."""
+    body = json.loads(llm_service._build_request_body('Say "hi"'))
+    assert body == {
+        "model": llm_service.model,
+        "messages": [
+            LLMService.SYSTEM_MESSAGE,
+            {"role": "user", "content": 'Say "hi"'}
+        ],
+        "functions": LLMService.FUNCTION_SCHEMAS,
+        "function_call": "auto",
+        "temperature": 0.7,
+        "stream": False
+    }
+    assert json.loads(llm_service._build_request_body("hi", stream=True))["stream"] is True
+
+def test_cache_response(llm_service):
+    """Test response caching."""
+    assert llm_service._get_cached_response("test") is None
+
+def test_format_qr_code_response_empty(llm_service):
+    """Test QR code response formatting with empty list."""
+    assert llm_service.format_qr_code_response([]) == "No QR codes found."
+
+def test_format_qr_code_response(llm_service):
+    """Test QR code response formatting with data."""
+    qr_codes = [{
+        'id': 1,
+        'url': 'https://example.com',
+        'description': 'Test QR',
+        'created_at': '2024-01-01T00:00:00',
+        'access_count': 5
+    }]
+    response = llm_service.format_qr_code_response(qr_codes)
+    assert 'QR Code #1' in response
+    assert 'https://example.com' in response
+    assert 'Test QR' in response
+
+@pytest.mark.parametrize("url,expected", [
+    ("example.com", "https://example.com"),
+    ("http://sub.example.com/path?q=1", "http://sub.example.com/path?q=1"),
+    ("https://bücher.example", "https://bücher.example"),
+])
+def test_format_url(llm_service, url, expected):
+    """Test URLs are given a scheme and accepted on both validation paths."""
+    assert llm_service.format_url(url) == expected
+
+@pytest.mark.parametrize("url", ["https://localhost", "https://example.com:8080", "https://user@example.com"])
+def test_format_url_invalid(llm_service, url):
+    """Test URLs without a public host name are rejected."""
+    with pytest.raises(ValueError):
+        llm_service.format_url(url)
+
+def test_process_user_request_success(llm_service, mock_requests):
+    """Test successful user request processing."""
+    result = llm_service.process_user_request("List all QR codes")
+    assert result['success'] == True
+    assert 'response' in result
+    mock_requests.assert_called_once()
+
+def test_process_user_request_cached(llm_service, mock_requests):
+    """Test identical read-only prompts reuse the cached completion."""
+    first = llm_service.process_user_request("List all QR codes")
+    second = llm_service.process_user_request("List all QR codes")
+    assert first['success'] and second['success']
+    mock_requests.assert_called_once()
+
+def test_process_user_request_not_cached_for_writes(llm_service, mock_requests):
+    """Test completions that change data are never replayed."""
+    mock_requests.return_value.json.return_value = {
+        'choices': [{
+            'message': {
+                'function_call': {
+                    'name': 'delete_qr_code',
+                    'arguments': '{"qr_id": 999}'
                 }
-            }]
-        }
+            }
+        }]
+    }
+    llm_service.process_user_request("Delete QR code 999")
+    llm_service.process_user_request("Delete QR code 999")
+    assert mock_requests.call_count == 2
+
+def test_stream_user_request(llm_service):
+    """Test streamed replies yield tokens and then the final result."""
+    lines = [
+        'data: {"choices": [{"delta": {"role": "assistant"}}]}',
+        '',
+        'data: {"choices": [{"delta": {"content": "Hello"}}]}',
+        'data: {"choices": [{"delta": {"content": " there"}}]}',
+        'data: [DONE]'
+    ]
+    with patch('requests.Session.post') as mock_post:
+        mock_post.return_value.status_code = 200
+        mock_post.return_value.iter_lines.return_value = lines
+
+        events = list(llm_service.stream_user_request("Say hello"))
+
+        assert events == [
+            ("token", "Hello"),
+            ("token", " there"),
+            ("result", {"success": True, "response": "Hello there"})
+        ]
+        assert mock_post.call_args.kwargs['stream'] is True
+
+def test_stream_user_request_function_call(llm_service):
+    """Test streamed function call fragments are joined and executed."""
+    lines = [
+        'data: {"choices": [{"delta": {"function_call": {"name": "count_qr_codes", "arguments": ""}}}]}',
+        'data: {"choices": [{"delta": {"function_call": {"arguments": "{}"}}}]}',
+        'data: [DONE]'
+    ]
+    with patch('requests.Session.post') as mock_post:
+        mock_post.return_value.status_code = 200
+        mock_post.return_value.iter_lines.return_value = lines
+
+        events = list(llm_service.stream_user_request("How many QR codes?"))
+
+        assert len(events) == 1
+        event, result = events[0]
+        assert event == "result"
+        assert result["function_call"]["name"] == "count_qr_codes"
+
+def test_process_user_request_api_error(llm_service):
+    """Test API error handling."""
+    with patch('requests.Session.post') as mock_post:
+        mock_response = MagicMock()
+        mock_response.status_code = 500
+        mock_post.side_effect = requests.exceptions.RequestException("API Error")
+        
+        result = llm_service.process_user_request("Test message")
+        assert result['success'] == False
+        assert "trouble connecting" in result['response']
+
+def test_process_user_request_rate_limit(llm_service, monkeypatch):
+    """Test a rate limit that asks for a long wait fails fast."""
+    sleeps = []
+    monkeypatch.setattr('app.services.llm_service.sleep', sleeps.append)
+    with patch('requests.Session.post') as mock_post:
+        mock_response = MagicMock(status_code=429, headers={'Retry-After': '60'})
         mock_post.return_value = mock_response
-        yield mock_post
+        
+        result = llm_service.process_user_request("Test message")
+        assert result['success'] == False
+        assert "too many requests" in result['response']
+        mock_response.close.assert_called_once()
+        assert mock_post.call_count == 1
+        assert sleeps == []
+
+def test_process_user_request_retries_server_errors(llm_service, monkeypatch):
+    """Test server errors are retried, taking a rate limit token per attempt."""
+    sleeps = []
+    monkeypatch.setattr('app.services.llm_service.sleep', sleeps.append)
+    monkeypatch.setattr(llm_service, '_rate_limit', MagicMock())
+    failed = MagicMock(status_code=503, headers={'Retry-After': '2'})
+    succeeded = MagicMock(status_code=200)
+    succeeded.json.return_value = {'choices': [{'message': {'content': 'Test response'}}]}
+    with patch('requests.Session.post', side_effect=[failed, succeeded]):
+        result = llm_service.process_user_request("Test message")
+
+    assert result['success'] == True
+    assert sleeps == [2.0]
+    assert llm_service._rate_limit.call_count == 2
+    failed.close.assert_called_once()
+
+def test_process_user_request_http_error_closes_response(llm_service, monkeypatch):
+    """Test a failed streamed response is closed so its connection is released."""
+    monkeypatch.setattr('app.services.llm_service.sleep', lambda seconds: None)
+    with patch('requests.Session.post') as mock_post:
+        mock_response = MagicMock(status_code=500, headers={})
+        mock_response.raise_for_status.side_effect = requests.exceptions.HTTPError("500 Server Error")
+        mock_post.return_value = mock_response
+
+        events = list(llm_service.stream_user_request("Test message"))
+        assert events[-1][1]['success'] == False
+        # Closed once per attempt
+        assert mock_response.close.call_count == mock_post.call_count == 4
+
+def test_session_retries_only_connection_errors(llm_service):
+    """Test the shared session never re-sends a POST that may have reached Groq."""
+    retry = llm_service.session.get_adapter(llm_service.api_url).max_retries
+    assert retry.connect > 0
+    assert retry.read == 0
+    assert retry.status == 0
+
+@pytest.mark.parametrize("function_name,args,expected", [
+    ("list_qr_codes", {}, {"qr_codes": []}),
+    ("create_qr_code", {"url": "https://example.com"}, 
+     {"qr_code_id": 1, "url": "https://example.com"}),
+    ("delete_qr_code", {"qr_id": 999}, 
+     {"success": False, "message": "QR code 999 not found"}),
+])
+def test_execute_function(llm_service, session, function_name, args, expected):
+    """Test function execution with various inputs."""
+    result = llm_service._execute_function(function_name, args)
+    for key in expected:
+        assert key in result
+        if isinstance(expected[key], list):
+            assert isinstance(result[key], list)
+        else:
+            assert result[key] == expected[key]
+
+def test_list_qr_codes_limit_argument(llm_service, session):
+    """Test a null limit uses the default and a non-integer one is rejected."""
+    session.add(QRCode(url='https://example.com', filename='limit.png'))
+    session.flush()
+
+    result = llm_service._execute_function("list_qr_codes", {"limit": None, "offset": None})
+    assert len(result["qr_codes"]) == 1
+
+    with pytest.raises(ValueError, match="limit must be an integer"):
+        llm_service._execute_function("list_qr_codes", {"limit": "many"})
+
+def test_list_qr_codes_pagination(llm_service, session):
+    """Test that list_qr_codes returns one page of QR codes."""
+    for i in range(3):
+        session.add(QRCode(url=f'https://example.com/{i}', filename=f'page{i}.png'))
+    session.flush()
+
+    first = llm_service._execute_function("list_qr_codes", {"limit": 2})
+    rest = llm_service._execute_function("list_qr_codes", {"limit": 2, "offset": 2})
+
+    assert len(first["qr_codes"]) == 2
+    assert len(rest["qr_codes"]) == 1
+    first_ids = {qr["id"] for qr in first["qr_codes"]}
+    assert not first_ids & {qr["id"] for qr in rest["qr_codes"]}
+
+def test_count_qr_codes(llm_service, session):
+    """Test that count_qr_codes counts in the database."""
+    session.add(QRCode(url='https://example.com/on', filename='on.png'))
+    session.add(QRCode(url='https://example.com/off', filename='off.png', is_active=False))
+    session.flush()
+
+    assert llm_service._execute_function("count_qr_codes", {})["count"] == 2
+    assert llm_service._execute_function("count_qr_codes", {"is_active": False})["count"] == 1
+
+def test_every_function_has_handler():
+    """Test each advertised function is dispatched to a handler."""
+    assert set(LLMService.FUNCTION_HANDLERS) == set(LLMService.AVAILABLE_FUNCTIONS)
+
+def test_execute_function_unknown(llm_service):
+    """Test unknown function handling."""
+    with pytest.raises(ValueError, match="Unknown function"):
+        llm_service._execute_function("unknown_function", {})
+
+def test_search_qr_codes(llm_service, session):
+    """Test QR code search functionality."""
+    # Create test QR code
+    now = datetime.now(timezone.utc)
+    qr = QRCode(
+        url='https://example.com',
+        filename='test.png',
+        description='Test QR',
+        created_at=now
+    )
+    session.add(qr)
+    session.flush()
+
+    result = llm_service._execute_function("search_qr_codes", {
+        "url": "example",
+        "description": "Test",
+        "is_active": True,
+        "created_after": (now - timedelta(seconds=1)).isoformat(),
+        "limit": 1
+    })
+        
+    assert "qr_codes" in result
+    assert result["total_results"] == 1
+
+def test_search_qr_codes_total_results(llm_service, session):
+    """Test search counts every match while returning one page."""
+    for i in range(3):
+        session.add(QRCode(url=f'https://search-total.example/{i}', filename=f'total{i}.png'))
+    session.flush()
+
+    result = llm_service._execute_function("search_qr_codes", {
+        "url": "search-total.example",
+        "limit": 2
+    })
+
+    assert len(result["qr_codes"]) == 2
+    assert result["total_results"] == 3
+
+def test_update_qr_code(llm_service, session):
+    """Test QR code update functionality."""
+    # Create test QR code
+    qr = QRCode(
+        url='https://example.com',
+        filename='test.png'
+    )
+    session.add(qr)
+    session.flush()
 
-@pytest.mark.usefixtures('mock_env')
-class TestLLMService:
-    def test_initialization(self, app):
-        """Test LLM service initialization."""
-        with app.app_context():
-            service = LLMService()
-            assert service.api_key == 'test_key'
-            assert service.model == 'mixtral-8x7b-32768'
-            assert service.rate_limit_delay == 1.0
-
-    def test_initialization_no_api_key(self):
-        """Test initialization without API key."""
-        with patch.dict(os.environ, {'GROQ_API_KEY': ''}, clear=True):
-            with pytest.raises(ValueError, match="GROQ_API_KEY environment variable not set"):
-                LLMService()
-
-    def test_rate_limit(self, app):
-        """Test rate limiting."""
-        with app.app_context():
-            service = LLMService()
-            with patch('time.sleep') as mock_sleep:
-                service._rate_limit()
-                service._rate_limit()
-                mock_sleep.assert_called_once()
-
-    def test_cache_response(self, app):
-        """Test response caching."""
-        with app.app_context():
-            service = LLMService()
-            assert service._get_cached_response("test") is None
-
-    def test_format_qr_code_response_empty(self, app):
-        """Test QR code response formatting with empty list."""
-        with app.app_context():
-            service = LLMService()
-            assert service.format_qr_code_response([]) == "No QR codes found."
-
-    def test_format_qr_code_response(self, app):
-        """Test QR code response formatting with data."""
-        with app.app_context():
-            service = LLMService()
-            qr_codes = [{
-                'id': 1,
-                'url': 'https://example.com',
-                'description': 'Test QR',
-                'created_at': '2024-01-01T00:00:00',
-                'access_count': 5
-            }]
-            response = service.format_qr_code_response(qr_codes)
-            assert 'QR Code #1' in response
-            assert 'https://example.com' in response
-            assert 'Test QR' in response
-
-    def test_process_user_request_success(self, mock_requests, app):
-        """Test successful user request processing."""
-        with app.app_context():
-            service = LLMService()
-            result = service.process_user_request("List all QR codes")
-            assert result['success'] == True
-            assert 'response' in result
-            mock_requests.assert_called_once()
-
-    def test_process_user_request_api_error(self, app):
-        """Test API error handling."""
-        with app.app_context(), patch('requests.post') as mock_post:
-            mock_response = MagicMock()
-            mock_response.status_code = 500
-            mock_post.side_effect = requests.exceptions.RequestException("API Error")
-            
-            service = LLMService()
-            result = service.process_user_request("Test message")
-            assert result['success'] == False
-            assert "trouble connecting" in result['response']
-
-    def test_process_user_request_rate_limit(self, app):
-        """Test rate limit error handling."""
-        with app.app_context(), patch('requests.post') as mock_post:
-            mock_response = MagicMock()
-            mock_response.status_code = 429
-            mock_post.return_value = mock_response
-            
-            service = LLMService()
-            result = service.process_user_request("Test message")
-            assert result['success'] == False
-            assert "too many requests" in result['response']
-
-    @pytest.mark.parametrize("function_name,args,expected", [
-        ("list_qr_codes", {}, {"qr_codes": []}),
-        ("create_qr_code", {"url": "https://example.com"}, 
-         {"qr_code_id": 1, "url": "https://example.com"}),
-        ("delete_qr_code", {"qr_id": 999}, 
-         {"success": False, "message": "QR code 999 not found"}),
-    ])
-    def test_execute_function(self, app, function_name, args, expected):
-        """Test function execution with various inputs."""
-        with app.app_context():
-            service = LLMService()
-            result = service._execute_function(function_name, args)
-            for key in expected:
-                assert key in result
-                if isinstance(expected[key], list):
-                    assert isinstance(result[key], list)
-                else:
-                    assert result[key] == expected[key]
-
-    def test_execute_function_unknown(self, app):
-        """Test unknown function handling."""
-        with app.app_context():
-            service = LLMService()
-            with pytest.raises(ValueError, match="Unknown function"):
-                service._execute_function("unknown_function", {})
-
-    def test_search_qr_codes(self, app, session):
-        """Test QR code search functionality."""
-        with app.app_context():
-            # Create test QR code
-            qr = QRCode(
-                url='https://example.com',
-                filename='test.png',
-                description='Test QR',
-                created_at=datetime.now(timezone.utc)
-            )
-            session.add(qr)
-            session.commit()
-
-            service = LLMService()
-            result = service._execute_function("search_qr_codes", {
-                "url": "example",
-                "description": "Test",
-                "is_active": True,
-                "created_after": datetime.now(timezone.utc).isoformat(),
-                "limit": 1
-            })
-            
-            assert "qr_codes" in result
-            assert "total_results" in result
-
-    def test_update_qr_code(self, app, session):
-        """Test QR code update functionality."""
-        with app.app_context():
-            # Create test QR code
-            qr = QRCode(
-                url='https://example.com',
-                filename='test.png'
-            )
-            session.add(qr)
-            session.commit()
-
-            service = LLMService()
-            result = service._execute_function("update_qr_code", {
-                "qr_id": qr.id,
-                "url": "https://updated.com",
-                "description": "Updated QR"
-            })
-            
-            assert result["success"] == True
-            assert result["qr_code"]["url"] == "https://updated.com"
\ No newline at end of file
+    result = llm_service._execute_function("update_qr_code", {
+        "qr_id": qr.id,
+        "url": "https://updated.com",
+        "description": "Updated QR"
+    })
+        
+    assert result["success"] == True
+    assert result["qr_code"]["url"] == "https://updated.com"
\ No newline at end of file
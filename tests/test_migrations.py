@@ -0,0 +1,55 @@
+import pytest
+import sqlalchemy as sa
+from pathlib import Path
+from alembic import command
+from alembic.config import Config
+from flask_migrate import Migrate
+from app import create_app
+from app.models import db
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / 'migrations'
+
+@pytest.fixture
+def migration_app(tmp_path, monkeypatch):
+    """App bound to an empty SQLite file database for running migrations."""
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'migrations.db'}")
+    app = create_app()
+    Migrate(app, db)
+    with app.app_context():
+        yield app
+        db.engine.dispose()
+
+def _alembic_config():
+    """Alembic config for the committed migrations, without logging setup."""
+    config = Config()
+    config.set_main_option('script_location', str(MIGRATIONS_DIR))
+    return config
+
+def test_upgrade_creates_current_schema(migration_app):
+    """Test the migrations build the schema the models expect."""
+    command.upgrade(_alembic_config(), 'head')
+
+    inspector = sa.inspect(db.engine)
+    columns = {column['name']: column for column in inspector.get_columns('qr_codes')}
+    assert set(columns) == set(db.metadata.tables['qr_codes'].columns.keys())
+    assert columns['access_count']['nullable'] == False
+    assert {index['name'] for index in inspector.get_indexes('qr_codes')} == {
+        'ix_qr_codes_created_at_id', 'ix_qr_codes_active_created_at', 'ix_qr_codes_short_code_active'
+    }
+
+def test_upgrade_adopts_baseline_database(migration_app):
+    """Test a database created before the migrations keeps its rows."""
+    with db.engine.begin() as connection:
+        connection.exec_driver_sql(
+            "CREATE TABLE qr_codes (id INTEGER PRIMARY KEY, url VARCHAR(500) NOT NULL, "
+            "filename VARCHAR(255) NOT NULL, fill_color VARCHAR(50), back_color VARCHAR(50), "
+            "created_at DATETIME, updated_at DATETIME, is_active BOOLEAN, description VARCHAR(500), "
+            "access_count INTEGER, is_dynamic BOOLEAN, short_code VARCHAR(16) UNIQUE)"
+        )
+        connection.exec_driver_sql("INSERT INTO qr_codes (url, filename) VALUES ('https://example.com', 'old.png')")
+
+    command.upgrade(_alembic_config(), 'head')
+
+    with db.engine.connect() as connection:
+        row = connection.exec_driver_sql("SELECT url, access_count, redirect_url FROM qr_codes").one()
+    assert tuple(row) == ('https://example.com', 0, None)
@@ -1,245 +1,337 @@
 import pytest
 from app.models.qr_code import QRCode
+from app.services.qr_service import QRCodeService
 from unittest.mock import patch, MagicMock
+from sqlalchemy.exc import IntegrityError
+import json
 import os
 
-def test_index_page(client, app):
+class _StubLLMService:
+    """Minimal stand-in for LLMService that answers every chat message."""
+
+    def process_user_request(self, user_input):
+        return {'success': True, 'response': 'Test response'}
+
+@pytest.fixture(scope='module')
+def stub_llm(app):
+    """Install one LLM service stub for the chat tests of this module."""
+    original = app.extensions.get('llm_service')
+    app.extensions['llm_service'] = _StubLLMService()
+    yield app.extensions['llm_service']
+    if original is None:
+        app.extensions.pop('llm_service', None)
+    else:
+        app.extensions['llm_service'] = original
+
+def _pop_flashes(client):
+    """Return and clear the flashed messages waiting in the client's session."""
+    with client.session_transaction() as flask_session:
+        return flask_session.pop('_flashes', [])
+
+@pytest.mark.real_template
+def test_index_page(client):
     """Test the index page loads successfully."""
-    with app.app_context():
-        response = client.get('/')
-        assert response.status_code == 200
+    response = client.get('/')
+    assert response.status_code == 200
+    assert 'ETag' not in response.headers
+    assert response.cache_control.no_cache
 
-def test_generate_qr_invalid_url(client, app):
+def test_generate_qr_invalid_url(client):
     """Test QR code generation with invalid URL."""
-    with app.app_context():
-        response = client.post('/generate', data={
-            'url': 'invalid_url',
-            'is_dynamic': 'on'
-        }, follow_redirects=True)
-        assert b'Invalid URL provided' in response.data
-
-def test_redirect_qr(client, session, app):
+    response = client.post('/generate', data={
+        'url': 'invalid_url',
+        'is_dynamic': 'on'
+    }, follow_redirects=True)
+    assert b'Invalid URL provided' in response.data
+
+def test_redirect_qr(client, session, make_qr_code):
     """Test QR code redirection."""
-    with app.app_context():
-        # Create a QR code first
-        qr_code = QRCode(url='https://example.com', filename='test.png', short_code='test123')
-        session.add(qr_code)
-        session.commit()
+    # Create a QR code first
+    qr_code = make_qr_code(short_code='test123')
         
-        response = client.get(f'/r/{qr_code.short_code}')
-        assert response.status_code == 302
-        assert response.location == 'https://example.com'
+    response = client.get(f'/r/{qr_code.short_code}')
+    assert response.status_code == 302
+    assert response.location == 'https://example.com'
+
+    # Access counts are buffered until the next flush
+    QRCodeService.flush_access_counts()
+    session.refresh(qr_code)
+    assert qr_code.access_count == 1
+
+def test_redirect_qr_inactive(client, make_qr_code):
+    """Test inactive and unknown short codes are not redirected."""
+    qr_code = make_qr_code(short_code='off123', is_active=False)
 
-def test_edit_qr(client, session, app):
+    assert client.get(f'/r/{qr_code.short_code}').status_code == 404
+    assert client.get('/r/missing').status_code == 404
+
+def test_edit_qr(client, make_qr_code):
     """Test QR code editing."""
-    with app.app_context():
-        # Create a QR code first
-        qr_code = QRCode(url='https://example.com', filename='test.png')
-        session.add(qr_code)
-        session.commit()
+    # Create a QR code first
+    qr_code = make_qr_code()
         
-        # Test GET request
-        response = client.get(f'/qr/{qr_code.id}/edit')
-        assert response.status_code == 200
+    # Test GET request
+    response = client.get(f'/qr/{qr_code.id}/edit')
+    assert response.status_code == 200
         
-        # Test POST request
-        response = client.post(f'/qr/{qr_code.id}/edit', data={
-            'url': 'https://updated.com',
-            'fill_color': 'blue',
-            'back_color': 'yellow',
-            'description': 'Updated QR',
-            'is_active': 'on'
-        })
-        assert response.status_code == 302
-
-def test_delete_qr(client, session, app):
+    # Test POST request
+    response = client.post(f'/qr/{qr_code.id}/edit', data={
+        'url': 'https://updated.com',
+        'fill_color': 'blue',
+        'back_color': 'yellow',
+        'description': 'Updated QR',
+        'is_active': 'on'
+    })
+    assert response.status_code == 302
+
+def test_delete_qr(client, session, make_qr_code):
     """Test QR code deletion."""
-    with app.app_context():
-        qr_code = QRCode(url='https://example.com', filename='test.png')
-        session.add(qr_code)
-        session.commit()
+    qr_code = make_qr_code()
         
-        response = client.post(f'/qr/{qr_code.id}/delete')
-        assert response.status_code == 302
-        assert session.query(QRCode).filter_by(id=qr_code.id).first() is None
+    response = client.post(f'/qr/{qr_code.id}/delete')
+    assert response.status_code == 302
+    assert session.query(QRCode).filter_by(id=qr_code.id).first() is None
 
-def test_dynamic_redirect(client, session, app):
+def test_dynamic_redirect(client, session, make_qr_code):
     """Test dynamic QR code redirection."""
-    with app.app_context():
-        # Create a QR code first
-        qr_code = QRCode(
-            url='https://example.com',
-            filename='test.png',
-            is_dynamic=True,
-            short_code='dyn123',
-            is_active=True
-        )
+    # Create a QR code first
+    qr_code = make_qr_code(
+        is_dynamic=True,
+        short_code='dyn123',
+        is_active=True,
+        redirect_url='https://redirect.com'
+    )
         
-        # Set redirect_url after creation
-        session.add(qr_code)
-        session.flush()  # Ensure the object is created in the session
-        qr_code.redirect_url = 'https://redirect.com'
-        session.commit()
+    # Test with redirect_url
+    response = client.get(f'/d/{qr_code.short_code}')
+    assert response.status_code == 302
+    assert response.location == 'https://redirect.com'
         
-        # Test with redirect_url
-        response = client.get(f'/d/{qr_code.short_code}')
-        assert response.status_code == 302
-        assert response.location == 'https://redirect.com'
-        
-        # Test fallback to original url when redirect_url is None
-        qr_code.redirect_url = None
-        session.commit()
-        response = client.get(f'/d/{qr_code.short_code}')
-        assert response.status_code == 302
-        assert response.location == 'https://example.com'
-
-def test_view_qr_details(client, session, app):
+    # Test fallback to original url when redirect_url is None
+    qr_code.redirect_url = None
+    session.flush()
+    QRCodeService.invalidate_redirect(qr_code)
+    response = client.get(f'/d/{qr_code.short_code}')
+    assert response.status_code == 302
+    assert response.location == 'https://example.com'
+
+def test_redirect_cache_invalidated_on_edit(client, make_qr_code):
+    """Test editing a QR code drops its cached redirect target."""
+    qr_code = make_qr_code(short_code='edit123')
+
+    assert client.get('/r/edit123').location == 'https://example.com'
+
+    client.post(f'/qr/{qr_code.id}/edit', data={
+        'url': 'https://updated.com',
+        'is_active': 'on'
+    })
+    assert client.get('/r/edit123').location == 'https://updated.com'
+
+    client.post(f'/qr/{qr_code.id}/edit', data={'url': 'https://updated.com'})
+    assert client.get('/r/edit123').status_code == 404
+
+def test_redirect_cache_invalidated_on_delete(client, make_qr_code):
+    """Test deleting a QR code drops its cached redirect target."""
+    qr_code = make_qr_code(short_code='gone123')
+
+    assert client.get('/r/gone123').status_code == 302
+
+    client.post(f'/qr/{qr_code.id}/delete')
+    assert client.get('/r/gone123').status_code == 404
+
+def test_view_qr_details(client, make_qr_code):
     """Test QR code details view."""
-    with app.app_context():
-        qr_code = QRCode(url='https://example.com', filename='test.png')
-        session.add(qr_code)
-        session.commit()
+    qr_code = make_qr_code()
         
-        response = client.get(f'/qr/{qr_code.id}/view')
-        assert response.status_code == 200
+    response = client.get(f'/qr/{qr_code.id}/view')
+    assert response.status_code == 200
 
-def test_generate_qr_code(client, session, tmp_path, app):
-    """Test QR code generation with valid data."""
-    with app.app_context():
-        # Set temporary QR code directory
-        client.application.config['QR_CODE_DIR'] = str(tmp_path)
-        
-        response = client.post('/generate', data={
-            'url': 'https://example.com',
-            'is_dynamic': 'on',  # Flask form data sends 'on' for checked checkboxes
-            'fill_color': 'blue',
-            'back_color': 'white',
-            'description': 'Test QR'
-        }, follow_redirects=True)
-        
-        assert b'QR Code generated successfully!' in response.data
-        qr_code = QRCode.query.order_by(QRCode.id.desc()).first()  # Get the most recent QR code
-        assert qr_code is not None
-        assert qr_code.url == 'https://example.com'
-        assert qr_code.is_dynamic == True
-        assert qr_code.short_code is not None
-        assert qr_code.fill_color == 'blue'
-        assert qr_code.back_color == 'white'
-        assert qr_code.description == 'Test QR'
-
-def test_generate_qr_code_static(client, session, tmp_path, app):
-    """Test static QR code generation."""
-    with app.app_context():
-        # Set temporary QR code directory
-        client.application.config['QR_CODE_DIR'] = str(tmp_path)
-        
-        # Clear any existing QR codes
-        session.query(QRCode).delete()
-        session.commit()
-        
-        response = client.post('/generate', data={
-            'url': 'https://example.com',
-            # is_dynamic not included, should default to False
-            'fill_color': 'red',
-            'back_color': 'white',
-            'description': 'Static QR'
-        }, follow_redirects=True)
-        
-        assert b'QR Code generated successfully!' in response.data
-        qr_code = QRCode.query.first()
-        assert qr_code is not None
-        assert qr_code.url == 'https://example.com'
-        assert qr_code.is_dynamic == False
-        assert qr_code.short_code is None  # Static QR codes should not have a short code
-        assert qr_code.fill_color == 'red'
-        assert qr_code.back_color == 'white'
-        assert qr_code.description == 'Static QR'
-
-def test_serve_qr_code(client, session, tmp_path, app):
+@pytest.mark.parametrize("is_dynamic,fill_color,description", [
+    ('on', 'blue', 'Test QR'),  # Flask form data sends 'on' for checked checkboxes
+    (None, 'red', 'Static QR'),  # is_dynamic not included, should default to False
+])
+def test_generate_qr_code(client, session, is_dynamic, fill_color, description):
+    """Test dynamic and static QR code generation with valid data."""
+    data = {
+        'url': 'https://example.com',
+        'fill_color': fill_color,
+        'back_color': 'white',
+        'description': description
+    }
+    if is_dynamic:
+        data['is_dynamic'] = is_dynamic
+    # Check the redirect and flash without rendering the index page
+    response = client.post('/generate', data=data)
+    assert response.status_code == 302
+    assert response.location == '/'
+    assert ('success', 'QR Code generated successfully!') in _pop_flashes(client)
+
+    qr_code = session.query(QRCode).order_by(QRCode.id.desc()).first()  # Get the most recent QR code
+    assert qr_code is not None
+    assert qr_code.url == 'https://example.com'
+    assert qr_code.is_dynamic == bool(is_dynamic)
+    # Only dynamic QR codes get a short code
+    assert (qr_code.short_code is not None) == bool(is_dynamic)
+    assert qr_code.fill_color == fill_color
+    assert qr_code.back_color == 'white'
+    assert qr_code.description == description
+
+def test_serve_qr_code(client, session, qr_dir, app):
     """Test serving QR code images."""
-    with app.app_context():
-        # Create a test file
-        test_file = tmp_path / "test.png"
-        test_file.write_bytes(b"test image data")
+    # Create a test file
+    test_file = qr_dir / "test.png"
+    test_file.write_bytes(b"test image data")
         
-        client.application.config['QR_CODE_DIR'] = str(tmp_path)
-        response = client.get('/qr_codes/test.png')
-        assert response.status_code == 200
-        assert response.data == b"test image data"
-
-def test_short_code_collision(client, session, app):
-    """Test short code generation with collision."""
-    with app.app_context():
-        # Create first QR code with a specific short code
-        qr_code1 = QRCode(
-            url='https://example1.com',
-            filename='test1.png',
-            is_dynamic=True,
-            short_code='test123'
-        )
-        session.add(qr_code1)
-        session.commit()
-        
-        # Create second QR code
-        qr_code2 = QRCode(
+    response = client.get('/qr_codes/test.png')
+    assert response.status_code == 200
+    assert response.data == b"test image data"
+    assert response.cache_control.public
+    assert response.cache_control.max_age == app.config['QR_IMAGE_MAX_AGE']
+
+    # Conditional requests are answered without resending the image
+    response = client.get('/qr_codes/test.png', headers={'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 304
+
+def test_short_code_collision(client, session, make_qr_code):
+    """Test short codes are unique and generated when not given."""
+    # Create first QR code with a specific short code
+    make_qr_code(
+        url='https://example1.com',
+        filename='test1.png',
+        is_dynamic=True,
+        short_code='test123'
+    )
+
+    # The unique index rejects a second QR code with the same short code
+    with pytest.raises(IntegrityError), session.begin_nested():
+        session.add(QRCode(
             url='https://example2.com',
             filename='test2.png',
-            is_dynamic=True
-        )
-        session.add(qr_code2)
-        session.commit()
-        
-        # Verify the important conditions
-        assert qr_code1.short_code != qr_code2.short_code  # Codes should be unique
-        assert len(qr_code2.short_code) == 8  # Length should be 8
-        assert QRCode.query.filter_by(short_code=qr_code2.short_code).count() == 1  # Should be unique in DB
+            is_dynamic=True,
+            short_code='test123'
+        ))
+
+    # Dynamic QR codes created without one get a generated short code
+    qr_code = QRCode(url='https://example3.com', filename='test3.png', is_dynamic=True)
+    assert qr_code.short_code != 'test123'
+    assert len(qr_code.short_code) == 16  # 12 random bytes, base64url-encoded
 
-def test_chat_endpoint_no_message(client, app):
-    """Test chat endpoint with no message."""
-    with app.app_context():
-        response = client.post('/chat', json={})
-        assert response.status_code == 400
+@pytest.mark.parametrize("path,request_kwargs", [
+    ('/chat', {'json': {}}),  # no message
+    ('/chat', {'data': 'message=hello'}),  # not JSON
+    ('/chat', {'json': ['hello']}),  # not a JSON object
+    ('/chat/stream', {'json': {}}),  # validated like /chat
+    ('/update_model', {'json': {}}),  # no model
+    ('/update_model', {'json': {'model': 'invalid_model'}}),
+])
+def test_json_endpoint_bad_request(client, path, request_kwargs):
+    """Test JSON endpoints reject missing or malformed input with a 400."""
+    response = client.post(path, **request_kwargs)
+    assert response.status_code == 400
 
 @pytest.mark.usefixtures('session')
-def test_chat_endpoint_success(client, app):
+def test_chat_endpoint_unexpected_error(client, app):
+    """Test unexpected chat failures are reported as JSON."""
+    mock_instance = MagicMock()
+    mock_instance.process_user_request.side_effect = RuntimeError('boom')
+    with patch.dict(app.extensions, {'llm_service': mock_instance}):
+        response = client.post('/chat', json={'message': 'List all QR codes'})
+        assert response.status_code == 500
+        assert response.json['success'] == False
+        assert response.json['error'] == 'boom'
+
+@pytest.mark.usefixtures('session', 'stub_llm')
+def test_chat_endpoint_success(client):
     """Test chat endpoint with valid message."""
-    with app.app_context():
-        with patch('app.services.llm_service.LLMService') as mock_llm:
-            mock_instance = MagicMock()
-            mock_instance.process_message.return_value = {'success': True, 'response': 'Test response'}
-            mock_llm.return_value = mock_instance
-            
-            response = client.post('/chat', json={'message': 'List all QR codes'})
-            assert response.status_code == 200
-            assert response.json['success'] == True
+    response = client.post('/chat', json={'message': 'List all QR codes'})
+    assert response.status_code == 200
+    assert response.json['success'] == True
+
+@pytest.mark.usefixtures('session')
+def test_chat_stream_endpoint(client, app):
+    """Test the streaming chat endpoint emits server-sent events."""
+    mock_instance = MagicMock()
+    mock_instance.stream_user_request.return_value = iter([
+        ('token', 'Hel'),
+        ('token', 'lo'),
+        ('result', {'success': True, 'response': 'Hello'})
+    ])
+    with patch.dict(app.extensions, {'llm_service': mock_instance}):
+        response = client.post('/chat/stream', json={'message': 'Say hello'})
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+        body = response.get_data(as_text=True)
+        assert 'event: token\ndata: "Hel"\n\n' in body
+        assert 'event: result\ndata: {"success": true, "response": "Hello"}\n\n' in body
+
+@pytest.mark.usefixtures('session')
+def test_chat_endpoint_reuses_llm_service(client, app):
+    """Test the LLM service is built once and reused across chat requests."""
+    with patch.dict(app.extensions), patch('app.services.llm_service.LLMService') as mock_llm:
+        app.extensions.pop('llm_service', None)
+        mock_llm.return_value.process_user_request.return_value = {'success': True, 'response': 'Test response'}
+
+        client.post('/chat', json={'message': 'List all QR codes'})
+        client.post('/chat', json={'message': 'List all QR codes'})
+        mock_llm.assert_called_once()
 
 @pytest.mark.usefixtures('session')
-def test_generate_qr_success(client, app):
+def test_generate_qr_success(client):
     """Test successful QR code generation."""
-    with app.app_context():
-        with patch('app.services.qr_service.QRCodeService') as mock_service:
-            mock_service.create_qr_code.return_value = (MagicMock(id=1), 'test.png')
-            
-            response = client.post('/generate', data={
-                'url': 'https://example.com',
-                'is_dynamic': 'on',
-                'fill_color': 'red',
-                'back_color': 'white',
-                'description': 'Test QR'
-            }, follow_redirects=True)
-            
-            assert response.status_code == 200
-            assert b'QR Code generated successfully!' in response.data
+    response = client.post('/generate', data={
+        'url': 'https://example.com',
+        'is_dynamic': 'on',
+        'fill_color': 'red',
+        'back_color': 'white',
+        'description': 'Test QR'
+    }, follow_redirects=True)
+        
+    assert response.status_code == 200
+    assert b'QR Code generated successfully!' in response.data
 
 @pytest.mark.usefixtures('session')
-def test_update_model_validation(client, app):
+def test_update_model_validation(client, app, monkeypatch):
     """Test model update validation."""
-    with app.app_context():
-        # Test invalid model
-        response = client.post('/update_model', json={'model': 'invalid_model'})
-        assert response.status_code == 400
-        
-        # Test valid model
-        response = client.post('/update_model', json={'model': 'mixtral-8x7b-32768'})
+    # The app is shared by the whole run, so restore the selection afterwards
+    monkeypatch.setitem(app.config, 'GROQ_MODEL', app.config['GROQ_MODEL'])
+
+    response = client.post('/update_model', json={'model': 'mixtral-8x7b-32768'})
+    assert response.status_code == 200
+    assert response.json['success'] == True
+    assert app.config['GROQ_MODEL'] == 'mixtral-8x7b-32768'
+
+@pytest.mark.usefixtures('session')
+def test_update_model_applies_to_llm_service(client, app):
+    """Test a model selection is used by the shared LLM service."""
+    with patch.dict(app.config), patch.dict(app.extensions):
+        app.extensions.pop('llm_service', None)
+        response = client.post('/update_model', json={'model': 'gemma-7b-it'})
+        assert response.status_code == 200
+        assert os.environ['GROQ_MODEL'] == 'mixtral-8x7b-32768'
+
+        with patch('requests.Session.post') as mock_post:
+            mock_post.return_value.status_code = 200
+            mock_post.return_value.json.return_value = {
+                'choices': [{'message': {'content': 'Test response'}}]
+            }
+            client.post('/chat', json={'message': 'Hello'})
+            assert json.loads(mock_post.call_args.kwargs['data'])['model'] == 'gemma-7b-it'
+
+@pytest.mark.real_template
+def test_index_page_pagination(client, session, app):
+    """Test the index page only renders one page of QR codes."""
+    with patch('app.controllers.qr_controller.INDEX_PAGE_SIZE', 1):
+        session.add_all([
+            QRCode(url='https://first.com', filename='first.png'),
+            QRCode(url='https://second.com', filename='second.png')
+        ])
+        session.flush()
+
+        # Both rows share a creation timestamp, so the id decides the order
+        response = client.get('/?page=1')
+        assert b'https://second.com' in response.data
+
+        response = client.get('/?page=2')
         assert response.status_code == 200
-        assert response.json['success'] == True
\ No newline at end of file
+        assert response.data.count(b'<tr>') == 2  # header row + one QR code
+        assert b'https://first.com' in response.data
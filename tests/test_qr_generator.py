@@ -1,6 +1,7 @@
 import pytest
 from pathlib import Path
-from app.utils.qr_generator import setup_logging, create_directory, is_valid_url, generate_qr_code
+from PIL import Image
+from app.utils.qr_generator import setup_logging, create_directory, is_valid_url, generate_qr_code, encode_qr, render_qr_image
 
 def test_setup_logging():
     """Test logging setup."""
@@ -38,6 +39,28 @@ def test_is_valid_url():
     # Note: localhost URLs are considered invalid in production for security
     assert is_valid_url("http://localhost:5000") == False
 
+def test_is_valid_url_structure():
+    """Test the structural URL checks used instead of the full regex."""
+    assert is_valid_url("https://example.com:8080/path") == True
+    assert is_valid_url("http://8.8.8.8/") == True
+    assert is_valid_url("ftp://example.com") == False
+    assert is_valid_url("https://exa mple.com") == False
+    assert is_valid_url("https://example.com:99999") == False
+    # Loopback and private addresses are valid targets on intranets
+    assert is_valid_url("http://127.0.0.1/path") == True
+    assert is_valid_url("http://192.168.1.10/") == True
+    assert is_valid_url("http://10.0.0.1") == True
+    assert is_valid_url("http://[::1]:8080/") == True
+    assert is_valid_url("https://example.com", strict=True) == True
+
+def test_is_valid_url_unhashable(caplog):
+    """Test non-string input is rejected and every invalid URL is logged."""
+    assert is_valid_url(["https://example.com"]) == False
+    assert is_valid_url("not_a_url") == False
+    assert is_valid_url("not_a_url") == False
+    assert caplog.text.count("Invalid URL provided: not_a_url") == 2
+
+@pytest.mark.slow
 def test_generate_qr_code(tmp_path):
     """Test QR code generation."""
     test_path = tmp_path / "test.png"
@@ -46,9 +69,29 @@ def test_generate_qr_code(tmp_path):
     assert generate_qr_code("https://example.com", test_path) == True
     assert test_path.exists()
     
+    # Colored codes are written as two-color palette PNGs
+    with Image.open(test_path) as img:
+        assert img.format == "PNG"
+        assert img.mode == "P"
+    
     # Test invalid URL
     assert generate_qr_code("invalid_url", test_path) == False
 
+def test_encode_qr_cached():
+    """Test encoding is reused for the same data."""
+    encode_qr.cache_clear()
+    assert encode_qr("https://example.com/cached") is encode_qr("https://example.com/cached")
+    assert encode_qr.cache_info().hits == 1
+
+@pytest.mark.slow
+def test_render_qr_image_matches_qrcode():
+    """Test the palette renderer produces the same pixels as qrcode's renderer."""
+    qr = encode_qr("https://example.com/render")
+    fast = render_qr_image(qr, "red", "white").convert("RGB")
+    reference = qr.make_image(fill_color="red", back_color="white").get_image().convert("RGB")
+    assert fast.size == reference.size
+    assert fast.tobytes() == reference.tobytes()
+
 def test_generate_qr_code_error(tmp_path, monkeypatch):
     """Test QR code generation error handling."""
     def mock_save(*args, **kwargs):
@@ -70,6 +113,8 @@ def test_generate_qr_code_error(tmp_path, monkeypatch):
             pass
     
     monkeypatch.setattr("qrcode.QRCode", lambda *args, **kwargs: MockQR())
+    encode_qr.cache_clear()
     
     test_path = tmp_path / "error.png"
-    assert generate_qr_code("https://example.com", test_path) == False
\ No newline at end of file
+    assert generate_qr_code("https://example.com", test_path) == False
+    encode_qr.cache_clear()
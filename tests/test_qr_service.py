@@ -1,48 +1,46 @@
+import threading
 import pytest
+from app import start_access_count_flusher
 from app.services.qr_service import QRCodeService
 from app.models.qr_code import QRCode
 from pathlib import Path
-import shutil
-
-@pytest.fixture
-def qr_code_dir(tmp_path):
-    """Create temporary directory for QR codes."""
-    qr_dir = tmp_path / "qr_codes"
-    qr_dir.mkdir()
-    yield qr_dir
-    shutil.rmtree(qr_dir)
+from unittest.mock import patch
 
 @pytest.mark.usefixtures('session')
 class TestQRCodeService:
-    def test_create_qr_code(self, app, qr_code_dir):
+    @pytest.mark.parametrize("is_dynamic", [True, False])
+    def test_create_qr_code(self, qr_dir, is_dynamic):
         """Test QR code creation with all parameters."""
-        with app.app_context():
-            qr_code, path = QRCodeService.create_qr_code(
-                url="https://example.com",
-                is_dynamic=True,
-                fill_color="blue",
-                back_color="white",
-                description="Test QR",
-                qr_code_dir=qr_code_dir
-            )
+        qr_code, path = QRCodeService.create_qr_code(
+            url="https://example.com",
+            is_dynamic=is_dynamic,
+            fill_color="blue",
+            back_color="white",
+            description="Test QR",
+            qr_code_dir=qr_dir
+        )
             
-            assert isinstance(qr_code, QRCode)
-            assert qr_code.url == "https://example.com"
-            assert qr_code.is_dynamic == True
-            assert qr_code.fill_color == "blue"
-            assert path.exists()
-
-    def test_update_qr_code(self, app, qr_code_dir):
-        """Test QR code updating with file operations."""
-        with app.app_context():
-            # Create initial QR code
-            qr_code, path = QRCodeService.create_qr_code(
-                url="https://example.com",
-                is_dynamic=False,
-                qr_code_dir=qr_code_dir
-            )
+        assert isinstance(qr_code, QRCode)
+        assert qr_code.id is not None
+        assert qr_code.url == "https://example.com"
+        assert qr_code.is_dynamic == is_dynamic
+        assert (qr_code.short_code is not None) == is_dynamic
+        assert qr_code.fill_color == "blue"
+        # The caller renders the image once it knows which URL to encode
+        assert path == qr_dir / qr_code.filename
+
+    @pytest.mark.parametrize("is_dynamic", [True, False])
+    def test_update_qr_code(self, qr_dir, is_dynamic):
+        """Test QR code updating re-renders static images."""
+        # Create initial QR code
+        qr_code, path = QRCodeService.create_qr_code(
+            url="https://example.com",
+            is_dynamic=is_dynamic,
+            qr_code_dir=qr_dir
+        )
             
-            # Update QR code
+        # Update QR code
+        with patch.object(QRCodeService, 'generate_qr_image_async') as mock_render:
             updated = QRCodeService.update_qr_code(
                 qr_code=qr_code,
                 url="https://updated.com",
@@ -51,11 +49,143 @@ class TestQRCodeService:
                 description="Updated QR",
                 is_active=True,
                 filename=qr_code.filename,
-                qr_code_dir=qr_code_dir
+                qr_code_dir=qr_dir
             )
             
-            assert updated.url == "https://updated.com"
-            assert updated.fill_color == "red"
-            assert path.exists()
+        assert updated.url == "https://updated.com"
+        assert updated.fill_color == "red"
+        # Dynamic images encode the unchanged short link, so only static ones are redrawn
+        if is_dynamic:
+            mock_render.assert_not_called()
+        else:
+            mock_render.assert_called_once_with("https://updated.com", path, "red", "yellow")
+
+    def test_create_qr_code_short_code_collision(self, app, session, qr_dir):
+        """Test a colliding short code is regenerated on insert."""
+        session.add(QRCode(url="https://example.com", filename="taken.png", short_code="taken123"))
+        session.commit()
+
+        with patch.object(QRCode, 'generate_short_code', side_effect=["taken123", "fresh123"]), \
+                patch('app.services.qr_service.time.sleep'):
+            qr_code, _ = QRCodeService.create_qr_code(
+                url="https://example.com",
+                is_dynamic=True,
+                fill_color="red",
+                back_color="white",
+                description="",
+                qr_code_dir=qr_dir
+            )
+
+        assert qr_code.id is not None
+        assert qr_code.short_code == "fresh123"
+
+    def test_bulk_create_qr_codes(self, session, qr_dir):
+        """Test creating several QR codes in one batch."""
+        with patch.object(QRCodeService, 'generate_qr_image_async') as mock_render:
+            created = QRCodeService.bulk_create_qr_codes(
+                [
+                    {"url": "https://example.com/a", "description": "Bulk A"},
+                    {"url": "https://example.com/b", "description": "Bulk B", "is_dynamic": True},
+                ],
+                qr_dir
+            )
+
+        assert [item["url"] for item in created] == ["https://example.com/a", "https://example.com/b"]
+        assert mock_render.call_count == 2
+        for item in created:
+            qr_code = session.get(QRCode, item["id"])
+            assert qr_code.url == item["url"]
+        assert session.get(QRCode, created[1]["id"]).short_code is not None
+
+    def test_seo_filename_is_unique_before_insert(self):
+        """Test filenames are assigned without waiting for a database id."""
+        first = QRCode(url="https://example.com", description="Same Name")
+        second = QRCode(url="https://example.com", description="Same Name")
+
+        assert first.filename.startswith("qr-same-name-")
+        assert "None" not in first.filename
+        assert first.filename != second.filename
+
+    def test_flush_access_counts(self, session):
+        """Test buffered access counts for several QR codes are written in one flush."""
+        first = QRCode(url="https://example.com/first", filename="first.png")
+        second = QRCode(url="https://example.com/second", filename="second.png")
+        session.add_all([first, second])
+        session.commit()
+
+        for _ in range(3):
+            QRCodeService.increment_access_count(first)
+        QRCodeService.increment_access_count(second)
+        QRCodeService.flush_access_counts()
+
+        session.refresh(first)
+        session.refresh(second)
+        assert first.access_count == 3
+        assert second.access_count == 1
+
+    def test_access_count_flusher(self, app, monkeypatch):
+        """Test buffered access counts are flushed on a timer without traffic."""
+        flushed = threading.Event()
+        release = threading.Event()
+
+        def fake_flush(force=True):
+            flushed.set()
+            # Hold the thread until it is stopped, so it never flushes for real
+            release.wait(timeout=5)
+
+        monkeypatch.setattr(QRCodeService, 'flush_access_counts', fake_flush)
+        monkeypatch.setitem(app.config, 'ACCESS_COUNT_FLUSH_INTERVAL', 0.01)
+
+        stop = start_access_count_flusher(app)
+        try:
+            assert flushed.wait(timeout=5)
+        finally:
+            stop.set()
+            release.set()
+
+    @pytest.mark.slow
+    @pytest.mark.real_qr
+    def test_generate_qr_image_async(self, qr_dir):
+        """Test QR code images can be rendered on the background pool."""
+        path = qr_dir / "async.png"
+        future = QRCodeService.generate_qr_image_async("https://example.com", path, "black", "white")
+        assert future.result(timeout=10)
+        assert path.exists()
+
+    def test_remove_qr_image_async(self, qr_dir):
+        """Test QR code images are removed on the background pool."""
+        path = qr_dir / "remove.png"
+        path.write_bytes(b"png")
+        QRCodeService.remove_qr_image_async(path).result(timeout=10)
+        assert not path.exists()
+
+        # Removing an image that is already gone is not an error
+        QRCodeService.remove_qr_image_async(path).result(timeout=10)
+
+    def test_image_jobs_run_in_order_per_path(self, qr_dir, monkeypatch):
+        """Test a removal queued behind a pending render waits for it."""
+        release = threading.Event()
+
+        def slow_render(data, path, fill_color='red', back_color='white'):
+            release.wait(timeout=10)
+            path.write_bytes(b"png")
+            return True
+
+        monkeypatch.setattr('app.services.qr_service.generate_qr_code', slow_render)
+        path = qr_dir / "ordered.png"
+        render = QRCodeService.generate_qr_image_async("https://example.com", path, "black", "white")
+        removal = QRCodeService.remove_qr_image_async(path)
+        release.set()
+
+        removal.result(timeout=10)
+        assert render.done()
+        assert not path.exists()
+
+    def test_validate_filename(self):
+        """Test filename validation."""
+        assert QRCodeService.validate_filename("qr-code_1.png") == True
+        assert QRCodeService.validate_filename("qr code.png") == False
+        assert QRCodeService.validate_filename("../qr.png") == False
+        assert QRCodeService.validate_filename("qr.jpg") == False
 
     # ... rest of the test methods with similar app.app_context() usage ...
\ No newline at end of file